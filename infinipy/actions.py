@@ -1,18 +1,21 @@
 from typing import List, Optional, Tuple
 from infinipy.stateblock import StateBlock
 from infinipy.statement import CompositeStatement
+from infinipy.worldstatement import InternedWorldStatement
 
 class Action:
     def __init__(self, name: str, prerequisites: List[CompositeStatement,], consequences: List[CompositeStatement],
-                 source_block: StateBlock, target_block: Optional[StateBlock] = None):
+                 source_block: StateBlock, target_block: Optional[StateBlock] = None, cost: float = 1.0):
         """
         Initializes an Action with prerequisites and consequences.
 
         :param name: The name of the action.
         :param prerequisites: A list of CompositeStatements representing the prerequisites for the action.
         :param consequences: A list of CompositeStatements representing the consequences of the action.
+        :param cost: The cost of performing the action, used by the best-first planners.
         """
         self.name = name
+        self.cost = cost
         self.prerequisites = CompositeStatement.from_composite_statements(prerequisites)
         self.consequences = CompositeStatement.from_composite_statements(consequences)
         # update the consequences with the prerequisites that are not already in the consequences
@@ -20,6 +23,9 @@ class Action:
         self.source_block = source_block
         self.target_block = target_block
         self.pre_dict, self.con_dict = self.categorize_statements()
+        # compiled once, the planners and Option reuse these instead of rebuilding them from the dictionaries
+        self.pre_world = InternedWorldStatement.from_dict(self.pre_dict)
+        self.con_world = InternedWorldStatement.from_dict(self.con_dict)
     
     def categorize_statements(self):
         """
@@ -105,4 +111,4 @@ class Action:
         return self.consequences(self.source_block, self.target_block)
     
     def __repr__(self):
-        return f"Action(name={self.name}, prerequisites={self.prerequisites}, consequences={self.consequences}, source_block={self.source_block}, target_block={self.target_block})"
+        return f"Action(name={self.name}, cost={self.cost}, prerequisites={self.prerequisites}, consequences={self.consequences}, source_block={self.source_block}, target_block={self.target_block})"
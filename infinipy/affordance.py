@@ -31,8 +31,7 @@ class Affordance:
         :return: True if all prerequisites are met, False otherwise.
         """
         for prerequisite in self.prerequisites:
-            result = prerequisite(source_block, target_block)['result']
-            if not result:
+            if not prerequisite.evaluate(source_block, target_block):
                 if verbose:
                     print(f"Affordance {self.name} is not applicable due to failed prerequisite.")
                 return False
@@ -44,7 +43,7 @@ class Affordance:
         """ explain why the affordance is not applicable """
         reasons = []
         for prerequisite in self.prerequisites:
-            result = prerequisite(source_block, target_block)['result']
+            result = prerequisite.evaluate(source_block, target_block)
             if not result:
                 reasons.append((prerequisite.name,result))
         return reasons
@@ -0,0 +1,111 @@
+from typing import Dict, List, Tuple, Optional, Callable, Sequence
+import numpy as np
+
+Position = Tuple[int, int]
+
+
+class AllPairsPaths:
+    def __init__(self, cells: Sequence[Position], neighbors: Callable[[Position], List[Position]], method: str = "bfs"):
+        """
+        All-pairs shortest paths over a small unit-weight graph of cells, stored as arrays.
+
+        distances[i, j] is the number of steps from cells[i] to cells[j], -1 when unreachable, and next_hop[i, j] is the index
+        of the first cell after cells[i] on a shortest path to cells[j], -1 when unreachable or i == j. Both are int32 (N, N)
+        arrays, a path is rebuilt on demand by following next_hop.
+
+        :param cells: The cells of the graph, their order defines the indices of the arrays.
+        :param neighbors: Returns the cells reachable in one step from a cell, cells not in cells are ignored.
+        :param method: "bfs" runs one vectorized breadth first search per source, O(N * E), best for sparse grids.
+                       "floyd_warshall" runs one min-plus update of the whole (N, N) matrix per intermediate cell, O(N^3).
+        """
+        if method not in ("bfs", "floyd_warshall"):
+            raise ValueError(f"Unknown all-pairs method {method}, expected 'bfs' or 'floyd_warshall'")
+        self.cells: List[Position] = list(cells)
+        self.index: Dict[Position, int] = {cell: i for i, cell in enumerate(self.cells)}
+        self.method = method
+        adjacency = [[self.index[neighbor] for neighbor in neighbors(cell) if neighbor in self.index] for cell in self.cells]
+        degree = max((len(row) for row in adjacency), default=0)
+        # neighbour table padded with -1, one row per cell
+        self.neighbor_table = np.full((len(self.cells), max(degree, 1)), -1, dtype=np.int32)
+        for i, row in enumerate(adjacency):
+            self.neighbor_table[i, :len(row)] = row
+        if method == "bfs":
+            self.distances, self.next_hop = self._bfs()
+        else:
+            self.distances, self.next_hop = self._floyd_warshall()
+
+    def _bfs(self) -> Tuple[np.ndarray, np.ndarray]:
+        size = len(self.cells)
+        table = self.neighbor_table
+        width = table.shape[1]
+        distances = np.full((size, size), -1, dtype=np.int32)
+        next_hop = np.full((size, size), -1, dtype=np.int32)
+        for source in range(size):
+            distance_row = distances[source]
+            hop_row = next_hop[source]
+            distance_row[source] = 0
+            frontier = table[source][table[source] >= 0]
+            frontier = frontier[frontier != source]
+            distance_row[frontier] = 1
+            hop_row[frontier] = frontier
+            steps = 1
+            while frontier.size:
+                steps += 1
+                candidates = table[frontier].ravel()
+                hops = np.repeat(hop_row[frontier], width)
+                mask = candidates >= 0
+                candidates, hops = candidates[mask], hops[mask]
+                mask = distance_row[candidates] < 0
+                candidates, hops = candidates[mask], hops[mask]
+                # a cell reached from several frontier cells keeps the first hop found
+                frontier, first = np.unique(candidates, return_index=True)
+                distance_row[frontier] = steps
+                hop_row[frontier] = hops[first]
+        return distances, next_hop
+
+    def _floyd_warshall(self) -> Tuple[np.ndarray, np.ndarray]:
+        size = len(self.cells)
+        unreachable = np.iinfo(np.int32).max // 2
+        distances = np.full((size, size), unreachable, dtype=np.int32)
+        next_hop = np.full((size, size), -1, dtype=np.int32)
+        sources, slots = np.nonzero(self.neighbor_table >= 0)
+        targets = self.neighbor_table[sources, slots]
+        distances[sources, targets] = 1
+        next_hop[sources, targets] = targets
+        np.fill_diagonal(distances, 0)
+        np.fill_diagonal(next_hop, -1)
+        for k in range(size):
+            through = distances[:, k, None] + distances[None, k, :]
+            improved = through < distances
+            np.copyto(distances, through, where=improved)
+            np.copyto(next_hop, np.broadcast_to(next_hop[:, k, None], next_hop.shape), where=improved)
+        distances[distances >= unreachable] = -1
+        return distances, next_hop
+
+    def distance(self, start: Position, end: Position) -> Optional[int]:
+        """ The number of steps from start to end, None if end is not reachable. """
+        distance = int(self.distances[self.index[start], self.index[end]])
+        return distance if distance >= 0 else None
+
+    def path(self, start: Position, end: Position) -> Optional[List[Position]]:
+        """
+        Rebuilds the shortest path from start to end.
+
+        :return: The cells from the one after start to end included, an empty list if start is end, None if end is not reachable.
+        """
+        i, j = self.index[start], self.index[end]
+        if self.distances[i, j] < 0:
+            return None
+        next_hop = self.next_hop
+        path = []
+        while i != j:
+            i = int(next_hop[i, j])
+            path.append(self.cells[i])
+        return path
+
+    def paths_dict(self) -> Dict[Tuple[Position, Position], List[Position]]:
+        """ Every path between two distinct cells keyed by (start, end), unreachable pairs are left out. """
+        paths = {}
+        for i, j in zip(*np.nonzero(self.distances > 0)):
+            paths[(self.cells[i], self.cells[j])] = self.path(self.cells[i], self.cells[j])
+        return paths
@@ -0,0 +1,109 @@
+from typing import Dict, List, Tuple, Optional, Any, Sequence, Union, TYPE_CHECKING
+import numpy as np
+from infinipy.stateblock import StateBlock
+from infinipy.entity_store import FLAGS
+if TYPE_CHECKING:
+    from infinipy.entity_store import EntityStore
+
+_MISSING = object()
+
+
+class BlockColumns:
+    def __init__(self, blocks: Sequence[StateBlock]):
+        """
+        Struct-of-arrays snapshot of a sequence of StateBlocks, used by Statement.evaluate_many to check attribute and
+        position statements with array operations instead of one Python call per block.
+
+        Columns are read from the blocks the first time they are needed and cached, so a snapshot describes the blocks as
+        they were when each column was first read. Build a new snapshot after the blocks change.
+
+        :param blocks: The StateBlocks of the snapshot, row i is blocks[i].
+        """
+        self._blocks: Optional[List[StateBlock]] = list(blocks)
+        self._store: Optional['EntityStore'] = None
+        self._rows: Optional[np.ndarray] = None
+        self._values: Dict[str, Optional[List[Any]]] = {}
+        self._truths: Dict[str, Optional[np.ndarray]] = {}
+        self._tuples: Dict[Tuple[str, int], Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+
+    @classmethod
+    def of(cls, blocks: Union['BlockColumns', Sequence[StateBlock]]) -> 'BlockColumns':
+        """ Returns blocks if it already is a snapshot, a new snapshot of blocks otherwise. """
+        return blocks if isinstance(blocks, cls) else cls(blocks)
+
+    @classmethod
+    def from_store(cls, store: 'EntityStore', rows: Optional[Sequence[int]] = None) -> 'BlockColumns':
+        """
+        Snapshot of entities of an EntityStore. The flags and positions are read from the columns of the store without
+        touching the entities, views are only created for the other attributes.
+
+        :param store: The EntityStore holding the entities.
+        :param rows: The rows of the entities, every entity of the store if None.
+        """
+        columns = cls([])
+        columns._blocks = None
+        columns._store = store
+        columns._rows = store.rows() if rows is None else np.asarray(rows, dtype=np.int64)
+        return columns
+
+    @property
+    def blocks(self) -> List[StateBlock]:
+        if self._blocks is None:
+            self._blocks = self._store.views(self._rows)
+        return self._blocks
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._blocks is None else len(self._blocks)
+
+    def values(self, attribute: str) -> Optional[List[Any]]:
+        """ The values of an attribute, one per block, None if a block does not have it. """
+        if attribute not in self._values:
+            values = [getattr(block, attribute, _MISSING) for block in self.blocks]
+            self._values[attribute] = None if any(value is _MISSING for value in values) else values
+        return self._values[attribute]
+
+    def truth(self, attribute: str) -> Optional[np.ndarray]:
+        """ Boolean column with the truth value of an attribute, None if a block does not have it. """
+        if attribute not in self._truths:
+            if self._store is not None and attribute in FLAGS:
+                self._truths[attribute] = self._store.flags[attribute][self._rows]
+                return self._truths[attribute]
+            values = self.values(attribute)
+            self._truths[attribute] = None if values is None else np.fromiter(map(bool, values), dtype=bool, count=len(values))
+        return self._truths[attribute]
+
+    def equals(self, attribute: str, value: Any) -> Optional[np.ndarray]:
+        """
+        Boolean column of attribute == value, None if a block does not have the attribute.
+        Tuples of integers, such as positions, are compared on an integer (N, len(value)) column shared by every value of the
+        same length.
+        """
+        if isinstance(value, tuple) and value and all(isinstance(item, (int, np.integer)) for item in value):
+            columns = self._tuple_column(attribute, len(value))
+            if columns is not None:
+                array, valid = columns
+                return valid & (array == np.asarray(value, dtype=np.int64)).all(axis=1)
+        values = self.values(attribute)
+        if values is None:
+            return None
+        return np.fromiter((item == value for item in values), dtype=bool, count=len(values))
+
+    def _tuple_column(self, attribute: str, length: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        key = (attribute, length)
+        if key not in self._tuples and self._store is not None and attribute == "position" and length <= 3:
+            positions, dims = self._store.resolved_positions(self._rows)
+            self._tuples[key] = (positions[:, :length].astype(np.int64), dims == length)
+        if key not in self._tuples:
+            values = self.values(attribute)
+            if values is None:
+                self._tuples[key] = None
+                return None
+            valid = np.fromiter((isinstance(item, tuple) and len(item) == length for item in values), dtype=bool, count=len(values))
+            padding = (0,) * length
+            try:
+                array = np.array([item if ok else padding for item, ok in zip(values, valid)]).reshape(len(values), length)
+            except ValueError:
+                array = None
+            # tuples holding something else than integers are compared one by one
+            self._tuples[key] = (array.astype(np.int64), valid) if array is not None and array.dtype.kind in "biu" else None
+        return self._tuples[key]
@@ -29,7 +29,7 @@ class Renderer:
         # Calculate the grid size in pixels
         grid_width = grid_map.width * self.TILE_SIZE
         grid_height = grid_map.height * self.TILE_SIZE
-        self.current_casted_cells = []
+        self.current_casted_cells = set()
         print(f"Grid size: {grid_width} x {grid_height}")
         
 
@@ -47,21 +47,14 @@ class Renderer:
         self.revealed_cells = set()  # Keep track of cells that have been revealed
         self.visited_cells = set() # Keep track of cells that have been visited
 
-    def update_fog_of_war(self, shadowcast_cells):
-        # Reset fog for all cells to either opaque or grayed out if they were previously revealed
-        for cell in self.revealed_cells:
-            cell_2d = cell[:2]
-            if cell_2d not in shadowcast_cells:
-                # Apply a gray overlay to previously revealed cells
-                self.fog_of_war_surface.fill((128, 128, 128, 128), (cell[0] * self.TILE_SIZE, cell[1] * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE))
-            else:
-                # Clear the fog for currently visible cells
-                self.fog_of_war_surface.fill((0, 0, 0, 0), (cell[0] * self.TILE_SIZE, cell[1] * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE))
-
-        # Update revealed cells with current shadowcast cells
-        for cell in shadowcast_cells:
-            cell_2d = cell[:2]
-            self.revealed_cells.add(cell_2d)
+    def update_fog_of_war(self, entered_cells, exited_cells):
+        # Only the cells whose visibility changed are redrawn
+        for cell in exited_cells:
+            # Apply a gray overlay to previously revealed cells
+            self.fog_of_war_surface.fill((128, 128, 128, 128), (cell[0] * self.TILE_SIZE, cell[1] * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE))
+
+        for cell in entered_cells:
+            self.revealed_cells.add(cell[:2])
             # Clear the fog for currently visible cells
             self.fog_of_war_surface.fill((0, 0, 0, 0), (cell[0] * self.TILE_SIZE, cell[1] * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE))
 
@@ -95,8 +88,8 @@ class Renderer:
         start_y = int(self.camera.pos[1] / self.TILE_SIZE)
         
         for entity_type in Renderer.RENDER_ORDER:
-            for entity in self.grid_map.get_all_entities():
-                if isinstance(entity, entity_type) and (entity.position[:2]) in self.current_casted_cells:
+            for entity in self.grid_map.entities_of_type(entity_type):
+                if (entity.position[:2]) in self.current_casted_cells:
                     x, y = entity.position[:2]
                     if self.is_on_screen(x, y):
                         sprite = self.sprite_gen.get_sprite(entity)
@@ -125,9 +118,10 @@ class Renderer:
     def render_shadowcast(self):
             if self.active_source:
                 shadowcast_origin = self.active_source + (0,)
-                shadowcast_cells = self.grid_map.shadow_casting(shadowcast_origin, max_radius=10)
-                self.current_casted_cells = [cell[:2] for cell in shadowcast_cells]
-                self.update_fog_of_war(shadowcast_cells)
+                _, entered_cells, exited_cells = self.grid_map.visibility.update(shadowcast_origin, radius=10, viewer=self)
+                self.current_casted_cells.difference_update(cell[:2] for cell in exited_cells)
+                self.current_casted_cells.update(cell[:2] for cell in entered_cells)
+                self.update_fog_of_war(entered_cells, exited_cells)
                 # self.current_casted_cells = []
                 # # Highlight each cell in shadowcast
                 # for cell in shadowcast_cells:
@@ -0,0 +1,457 @@
+from typing import Dict, List, Tuple, Optional, Any, Type, Sequence
+import dataclasses
+import uuid
+import numpy as np
+from infinipy.stateblock import StateBlock
+
+# the boolean flags of StateBlock, each stored as a bool column
+FLAGS = ("blocks_move", "blocks_los", "can_store", "can_be_stored", "can_act", "can_move", "can_be_moved")
+# stored_in values that are not a row of the store
+NOT_STORED = -1
+EXTERNAL_CONTAINER = -2
+
+_MISSING = object()
+
+
+class _FlagField:
+    """ Descriptor of a boolean attribute kept in a bool column of the store. """
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, block, owner=None):
+        if block is None:
+            return self
+        return bool(block._store.flags[self.name][block._row])
+
+    def __set__(self, block, value):
+        block._store.flags[self.name][block._row] = value
+
+
+class _StringField:
+    """ Descriptor of a string attribute kept as an index into the interned strings of the store. """
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, block, owner=None):
+        if block is None:
+            return self
+        store = block._store
+        return store.strings[store.string_columns[self.name][block._row]]
+
+    def __set__(self, block, value):
+        store = block._store
+        store.string_columns[self.name][block._row] = store.intern(value)
+
+
+class _ExtraField:
+    """ Descriptor of any other attribute, kept in a sparse per-row dictionary of the store. """
+    __slots__ = ("name", "default")
+
+    def __init__(self, name: str, default: Any = _MISSING):
+        self.name = name
+        self.default = default
+
+    def __get__(self, block, owner=None):
+        if block is None:
+            return self
+        value = block._store.extras.get(self.name, {}).get(block._row, self.default)
+        if value is _MISSING:
+            raise AttributeError(f"'{type(block).__name__}' object has no attribute '{self.name}'")
+        return value
+
+    def __set__(self, block, value):
+        block._store.extras.setdefault(self.name, {})[block._row] = value
+
+
+class StoredStateBlock(StateBlock):
+    """
+    View onto a row of an EntityStore. It is a StateBlock, and an instance of the type of the block it was made from, whose
+    attributes are read from and written to the columns of the store. The data of an entity lives in the row, a view keeps
+    the instance layout of StateBlock, which is a regular dataclass, but never fills its instance dictionary. Views are created
+    by EntityStore.add and EntityStore.view and can be dropped and recreated at any time.
+    A view of a removed entity must not be used, its row is reused by the next added entity.
+    """
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: 'EntityStore', row: int):
+        object.__setattr__(self, "_store", store)
+        object.__setattr__(self, "_row", row)
+
+    @property
+    def id(self) -> str:
+        return str(uuid.UUID(bytes=self._store.ids[self._row].tobytes()))
+
+    @id.setter
+    def id(self, value: str):
+        raw = bytes.fromhex(value.replace("-", ""))
+        if len(raw) != 16:
+            raise ValueError(f"Id {value} is not a UUID")
+        self._store.ids[self._row] = np.frombuffer(raw, dtype=np.uint8)
+
+    @property
+    def position(self) -> Optional[Tuple[int, ...]]:
+        stored_in = self.stored_in
+        if stored_in:
+            return stored_in.position
+        return self._store.own_position(self._row)
+
+    @position.setter
+    def position(self, value: Optional[Tuple[int, ...]]):
+        self._store.set_position(self._row, value)
+
+    @property
+    def _position(self) -> Optional[Tuple[int, ...]]:
+        # the attribute behind StateBlock.position, read by code going through vars()
+        return self._store.own_position(self._row)
+
+    @_position.setter
+    def _position(self, value: Optional[Tuple[int, ...]]):
+        self._store.set_position(self._row, value)
+
+    @property
+    def inventory(self) -> List[StateBlock]:
+        # created on first access, most blocks never hold anything
+        return self._store.inventories.setdefault(self._row, [])
+
+    @inventory.setter
+    def inventory(self, value: List[StateBlock]):
+        self._store.inventories[self._row] = value
+
+    @property
+    def inventory_size(self) -> int:
+        return int(self._store.inventory_sizes[self._row])
+
+    @inventory_size.setter
+    def inventory_size(self, value: int):
+        self._store.inventory_sizes[self._row] = value
+
+    @property
+    def stored_in(self) -> Optional[StateBlock]:
+        return self._store.container(self._row)
+
+    @stored_in.setter
+    def stored_in(self, value: Optional[StateBlock]):
+        self._store.set_container(self._row, value)
+
+    @property
+    def __dict__(self) -> Dict[str, Any]:
+        """ Snapshot of the attributes laid out as in a plain StateBlock, so that vars() keeps working on views. """
+        return self._store.attributes(self._row)
+
+    def __getattr__(self, name: str) -> Any:
+        # only reached for attributes without a descriptor, set on this row only
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = self._store.extras.get(name, {}).get(self._row, _MISSING)
+        if value is _MISSING:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return value
+
+    def __setattr__(self, name: str, value: Any):
+        # attributes never go to the instance __dict__ inherited from StateBlock, rows must not cost a dictionary
+        descriptor = getattr(type(self), name, _MISSING)
+        if descriptor is _MISSING:
+            self._store.extras.setdefault(name, {})[self._row] = value
+            return
+        if not hasattr(descriptor, "__set__"):
+            # the class values of the block type are already extra fields of the view type, this is a method or the like
+            raise AttributeError(f"'{type(self).__name__}' object attribute '{name}' is read-only")
+        descriptor.__set__(self, value)
+
+    def __eq__(self, other):
+        if isinstance(other, StoredStateBlock):
+            return self._store is other._store and self._row == other._row
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r}, name={self.name!r}, position={self.position})"
+
+
+class EntityStore:
+    def __init__(self, capacity: int = 1024):
+        """
+        Optional columnar storage of StateBlocks, for worlds made of many blocks that only differ in position and a few flags.
+
+        Each entity is a row of NumPy columns: the boolean flags, the position, the interned name and owner id, the inventory
+        size and the row of the block it is stored in, plus its UUID as 16 bytes. Inventories and any other attribute are kept
+        in sparse dictionaries, only for the rows that have them. A row takes about 55 bytes. The entities are handled through
+        StoredStateBlock views, which behave as the original blocks, while rows, columns and resolved_positions give
+        vectorized access to all of them at once.
+
+        :param capacity: The initial number of rows, the columns double in size when they are full.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.size = 0
+        self.ids = np.zeros((capacity, 16), dtype=np.uint8)
+        self.positions = np.zeros((capacity, 3), dtype=np.int32)
+        # number of coordinates of each position, 0 for None
+        self.position_dims = np.zeros(capacity, dtype=np.int8)
+        self.inventory_sizes = np.zeros(capacity, dtype=np.int32)
+        self.stored_in = np.full(capacity, NOT_STORED, dtype=np.int32)
+        self.types = np.zeros(capacity, dtype=np.int16)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.flags: Dict[str, np.ndarray] = {flag: np.zeros(capacity, dtype=bool) for flag in FLAGS}
+        self.string_columns: Dict[str, np.ndarray] = {
+            "name": np.zeros(capacity, dtype=np.int32),
+            "owner_id": np.zeros(capacity, dtype=np.int32),
+        }
+        self.strings: List[str] = []
+        self._string_index: Dict[str, int] = {}
+        self.extras: Dict[str, Dict[int, Any]] = {}
+        self.inventories: Dict[int, List[StateBlock]] = {}
+        # containers of the stored rows whose container is not a row of this store
+        self.external_containers: Dict[int, StateBlock] = {}
+        self._free: List[int] = []
+        self._view_types: List[Type[StoredStateBlock]] = []
+        self._view_type_index: Dict[type, int] = {}
+
+    def __len__(self) -> int:
+        return self.size - len(self._free)
+
+    def intern(self, string: str) -> int:
+        """ The index of string in the interned strings, added if new. """
+        index = self._string_index.get(string)
+        if index is None:
+            index = self._string_index[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def _arrays(self) -> List[Tuple[object, str]]:
+        arrays = [(self, name) for name in ("ids", "positions", "position_dims", "inventory_sizes", "stored_in", "types", "alive")]
+        arrays += [(self.flags, name) for name in self.flags]
+        arrays += [(self.string_columns, name) for name in self.string_columns]
+        return arrays
+
+    def _grow(self):
+        for holder, name in self._arrays():
+            array = holder[name] if isinstance(holder, dict) else getattr(holder, name)
+            grown = np.zeros((array.shape[0] * 2,) + array.shape[1:], dtype=array.dtype)
+            if name == "stored_in":
+                grown.fill(NOT_STORED)
+            grown[:array.shape[0]] = array
+            if isinstance(holder, dict):
+                holder[name] = grown
+            else:
+                setattr(holder, name, grown)
+
+    def _view_type(self, block_type: type) -> int:
+        index = self._view_type_index.get(block_type)
+        if index is not None:
+            return index
+        if issubclass(block_type, StoredStateBlock):
+            raise ValueError(f"{block_type.__name__} is already a stored view type")
+        namespace: Dict[str, Any] = {"__slots__": ()}
+        namespace.update({flag: _FlagField(flag) for flag in FLAGS})
+        namespace.update({name: _StringField(name) for name in self.string_columns})
+        base_fields = {field.name for field in dataclasses.fields(StateBlock)}
+        if dataclasses.is_dataclass(block_type):
+            for field in dataclasses.fields(block_type):
+                if field.name in base_fields:
+                    continue
+                if field.type in (bool, "bool"):
+                    self.flags.setdefault(field.name, np.zeros(self.ids.shape[0], dtype=bool))
+                    namespace[field.name] = _FlagField(field.name)
+                else:
+                    namespace[field.name] = _ExtraField(field.name)
+        seen = set(namespace) | set(vars(StoredStateBlock))
+        for klass in block_type.__mro__[:-1]:
+            for name, value in vars(klass).items():
+                if name in seen or name.startswith("__"):
+                    continue
+                seen.add(name)
+                if not hasattr(value, "__get__"):
+                    # a plain class value, a row can shadow it while the other rows keep reading the class value
+                    namespace[name] = _ExtraField(name, value)
+        # StoredStateBlock comes first in the method resolution order, its properties and __eq__ override the ones of block_type
+        view_type = type(f"Stored{block_type.__name__}", (StoredStateBlock, block_type), namespace)
+        index = self._view_type_index[block_type] = len(self._view_types)
+        self._view_types.append(view_type)
+        return index
+
+    def add(self, block: StateBlock) -> StoredStateBlock:
+        """
+        Copies a StateBlock into a new row and returns its view, which keeps the id of the block. The items of its inventory
+        and the block it is stored in are linked to the view instead of the block.
+
+        :param block: The block to store, it should no longer be used afterwards.
+        :return: The StoredStateBlock view of the new row, an instance of type(block).
+        """
+        if isinstance(block, StoredStateBlock):
+            raise ValueError(f"Block {block.name} is already stored")
+        if not isinstance(block, StateBlock):
+            raise ValueError(f"Block {block} is not a StateBlock")
+        type_index = self._view_type(type(block))
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self.size == self.ids.shape[0]:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.alive[row] = True
+        self.types[row] = type_index
+        view = self._view_types[type_index](self, row)
+        attributes = dict(vars(block))
+        view.id = attributes.pop("id")
+        self.set_position(row, attributes.pop("_position", None))
+        # the StateBlock fields are written straight to their columns, the other attributes go through the view
+        for flag in FLAGS:
+            self.flags[flag][row] = attributes.pop(flag)
+        for name, column in self.string_columns.items():
+            column[row] = self.intern(attributes.pop(name))
+        self.inventory_sizes[row] = attributes.pop("inventory_size")
+        inventory = attributes.pop("inventory", [])
+        container = attributes.pop("stored_in", None)
+        for name, value in attributes.items():
+            setattr(view, name, value)
+        for item in inventory:
+            item.stored_in = view
+        if inventory:
+            self.inventories[row] = list(inventory)
+        if container is not None:
+            view.stored_in = container
+            container.inventory[:] = [view if item is block else item for item in container.inventory]
+        return view
+
+    def remove(self, view: StoredStateBlock):
+        """ Frees the row of a view, the items of its inventory are no longer stored in it. """
+        if view._store is not self or not self.alive[view._row]:
+            raise ValueError(f"Block {view._row} is not an entity of this store")
+        row = view._row
+        for item in self.inventories.pop(row, []):
+            item.stored_in = None
+        self.external_containers.pop(row, None)
+        for values in self.extras.values():
+            values.pop(row, None)
+        self.stored_in[row] = NOT_STORED
+        self.alive[row] = False
+        self._free.append(row)
+
+    def view(self, row: int) -> StoredStateBlock:
+        """ A new view of a row. """
+        if not (0 <= row < self.size and self.alive[row]):
+            raise ValueError(f"Row {row} is not an entity of this store")
+        return self._view_types[self.types[row]](self, row)
+
+    def views(self, rows: Optional[Sequence[int]] = None) -> List[StoredStateBlock]:
+        """ Views of the given rows, of every entity if rows is None. """
+        if rows is None:
+            rows = self.rows()
+        view_types = self._view_types
+        types = self.types
+        return [view_types[types[row]](self, int(row)) for row in rows]
+
+    def rows(self, **conditions: bool) -> np.ndarray:
+        """
+        The rows of the entities whose flags have the given values, e.g. rows(blocks_move=True, can_act=False).
+
+        :return: The sorted int array of the matching rows.
+        """
+        mask = self.alive[:self.size].copy()
+        for flag, value in conditions.items():
+            if flag not in self.flags:
+                raise ValueError(f"Unknown flag {flag}")
+            mask &= self.flags[flag][:self.size] == value
+        return np.flatnonzero(mask)
+
+    def column(self, flag: str) -> np.ndarray:
+        """ The bool column of a flag over the rows in use, a view of the store array. """
+        if flag not in self.flags:
+            raise ValueError(f"Unknown flag {flag}")
+        return self.flags[flag][:self.size]
+
+    def own_position(self, row: int) -> Optional[Tuple[int, ...]]:
+        """ The position stored for a row, ignoring the block it is stored in. """
+        dims = int(self.position_dims[row])
+        if dims == 0:
+            return None
+        return tuple(self.positions[row, :dims].tolist())
+
+    def set_position(self, row: int, position: Optional[Tuple[int, ...]]):
+        if position is None:
+            self.position_dims[row] = 0
+            return
+        if not 1 <= len(position) <= 3 or any(int(value) != value for value in position):
+            raise ValueError(f"Position {position} is not a tuple of up to 3 integers")
+        self.positions[row, :len(position)] = position
+        self.position_dims[row] = len(position)
+
+    def resolved_positions(self, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The positions of the given rows as the position attribute reports them, i.e. the position of the block they are
+        stored in for stored rows.
+
+        :param rows: The rows, every row in use if None.
+        :return: (positions, dims), an int (N, 3) array and the number of coordinates of each position, 0 for None.
+        """
+        rows = np.arange(self.size) if rows is None else np.asarray(rows, dtype=np.int64)
+        positions = self.positions[rows]
+        dims = self.position_dims[rows]
+        containers = self.stored_in[rows]
+        for _ in range(self.size):
+            inside = containers >= 0
+            if not inside.any():
+                break
+            positions[inside] = self.positions[containers[inside]]
+            dims[inside] = self.position_dims[containers[inside]]
+            containers[inside] = self.stored_in[containers[inside]]
+        for index in np.flatnonzero(containers == EXTERNAL_CONTAINER):
+            # the chain leaves the store, the position is asked to the outside container
+            row = int(rows[index])
+            while self.stored_in[row] >= 0:
+                row = int(self.stored_in[row])
+            position = self.external_containers[row].position
+            dims[index] = 0 if position is None else len(position)
+            if position is not None:
+                positions[index, :len(position)] = position
+        return positions, dims
+
+    def container(self, row: int) -> Optional[StateBlock]:
+        """ The block a row is stored in, None if it is not stored. """
+        container = int(self.stored_in[row])
+        if container == NOT_STORED:
+            return None
+        if container == EXTERNAL_CONTAINER:
+            return self.external_containers[row]
+        return self.view(int(container))
+
+    def set_container(self, row: int, container: Optional[StateBlock]):
+        self.external_containers.pop(row, None)
+        if container is None:
+            self.stored_in[row] = NOT_STORED
+        elif isinstance(container, StoredStateBlock) and container._store is self:
+            self.stored_in[row] = container._row
+        else:
+            self.stored_in[row] = EXTERNAL_CONTAINER
+            self.external_containers[row] = container
+
+    def attributes(self, row: int) -> Dict[str, Any]:
+        """ The attributes of a row, with the keys vars() returns for a plain StateBlock. """
+        view = self.view(row)
+        attributes = {}
+        for field in dataclasses.fields(view):
+            if field.name == "position":
+                attributes["_position"] = self.own_position(row)
+            elif field.name == "inventory":
+                attributes["inventory"] = self.inventories.get(row, [])
+            else:
+                attributes[field.name] = getattr(view, field.name)
+        for name, values in self.extras.items():
+            if row in values:
+                attributes[name] = values[row]
+        return attributes
+
+    @property
+    def nbytes(self) -> int:
+        """ The memory used by the columns, the sparse dictionaries and the interned strings excluded. """
+        return sum((holder[name] if isinstance(holder, dict) else getattr(holder, name)).nbytes for holder, name in self._arrays())
+
+    def __repr__(self):
+        return f"EntityStore(entities={len(self)}, capacity={self.ids.shape[0]})"
@@ -0,0 +1,205 @@
+from typing import Dict, List, Tuple, Optional, Iterable, FrozenSet, TYPE_CHECKING
+import math
+import numpy as np
+from infinipy.utils import LRUCache
+if TYPE_CHECKING:
+    from infinipy.gridmap import GridMap
+
+# the eight directions as (dx, dy), straight ones first so that ties of the direction field prefer straight steps
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+class FlowField:
+    def __init__(self, grid_map: 'GridMap', goals: Iterable[Tuple[int, int, int]], max_distance: Optional[float] = None,
+                 diagonal_cost: float = math.sqrt(2), allow_corner_cutting: bool = True):
+        """
+        Integration and direction fields towards a set of goal cells of one z level, shared by every agent heading to them.
+
+        The integration field holds the cost of the shortest path from every cell to its closest goal. It is computed from a
+        snapshot of blocks_move_grid by a multi-source Dijkstra whose frontier is relaxed as a whole with numpy at each wave,
+        with unit costs this is a breadth first search visiting every cell once. The direction field then gives, for every
+        reachable cell, the step towards the neighbour on a shortest path, so next_step is a single array lookup.
+        A field describes the blockers at the time it was computed, GridMap.flow_field returns fields kept up to date.
+
+        :param grid_map: The GridMap whose blocks_move_grid is followed.
+        :param goals: The goal positions, all on the same z level. Blocked goals are ignored.
+        :param max_distance: Cells farther than max_distance from every goal are left unreachable, None for no limit.
+        :param diagonal_cost: The cost of a diagonal step, straight steps cost 1. The default matches GridMap.a_star.
+        :param allow_corner_cutting: If False, a diagonal step is only allowed when both adjacent straight cells are free.
+        """
+        self.goals: FrozenSet[Tuple[int, int, int]] = frozenset(goals)
+        if not self.goals:
+            raise ValueError("A flow field needs at least one goal")
+        levels = {goal[2] for goal in self.goals}
+        if len(levels) > 1:
+            raise ValueError("The goals of a flow field must be on the same z level")
+        self.z = levels.pop()
+        self.width, self.height = grid_map.map_size
+        for x, y, z in self.goals:
+            if not (0 <= x < self.width and 0 <= y < self.height and 0 <= z < grid_map.depth):
+                raise ValueError(f"Goal {(x, y, z)} is out of bounds")
+        if diagonal_cost < 1:
+            raise ValueError("diagonal_cost must be at least the cost of a straight step")
+        self.max_distance = max_distance
+        self.diagonal_cost = diagonal_cost
+        self.allow_corner_cutting = allow_corner_cutting
+        self.distances, self.directions = self._compute(grid_map.blocks_move_grid[:, :, self.z])
+
+    def _compute(self, blocked: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        width, height = self.width, self.height
+        # padded with a blocked border, so that the flat neighbour offsets never wrap around a row
+        padded_height = height + 2
+        free = np.zeros((width + 2, padded_height), dtype=bool)
+        free[1:-1, 1:-1] = ~blocked
+        free_flat = free.ravel()
+        distances = np.full(free.size, np.inf)
+        steps = []
+        for dx, dy in DIRECTIONS:
+            diagonal = dx != 0 and dy != 0
+            cost = self.diagonal_cost if diagonal else 1.0
+            sides = (dx * padded_height, dy) if diagonal and not self.allow_corner_cutting else None
+            steps.append((dx * padded_height + dy, cost, sides))
+
+        frontier = np.array(sorted((x + 1) * padded_height + y + 1 for x, y, _ in self.goals), dtype=np.int64)
+        frontier = frontier[free_flat[frontier]]
+        distances[frontier] = 0.0
+        while frontier.size:
+            frontier_distances = distances[frontier]
+            improved = []
+            for offset, cost, sides in steps:
+                targets = frontier + offset
+                candidates = frontier_distances + cost
+                mask = free_flat[targets] & (candidates < distances[targets])
+                if sides is not None:
+                    mask &= free_flat[frontier + sides[0]] & free_flat[frontier + sides[1]]
+                if self.max_distance is not None:
+                    mask &= candidates <= self.max_distance
+                targets = targets[mask]
+                # a fixed offset maps distinct frontier cells to distinct targets, a plain assignment is enough
+                distances[targets] = np.minimum(distances[targets], candidates[mask])
+                improved.append(targets)
+            frontier = np.unique(np.concatenate(improved))
+
+        distances = distances.reshape(free.shape)
+        inner = distances[1:-1, 1:-1]
+        through = np.empty((len(steps), width, height))
+        for index, (dx, dy) in enumerate(DIRECTIONS):
+            neighbour = distances[1 + dx:width + 1 + dx, 1 + dy:height + 1 + dy] + steps[index][1]
+            if steps[index][2] is not None:
+                neighbour = np.where(free[1 + dx:width + 1 + dx, 1:-1] & free[1:-1, 1 + dy:height + 1 + dy], neighbour, np.inf)
+            through[index] = neighbour
+        best = np.argmin(through, axis=0)
+        moving = np.isfinite(inner) & (inner > 0)
+        directions = np.zeros((width, height, 2), dtype=np.int8)
+        directions[moving] = np.array(DIRECTIONS, dtype=np.int8)[best[moving]]
+        return inner.copy(), directions
+
+    def distance(self, position: Tuple[int, int, int]) -> float:
+        """ The cost from position to the closest goal, inf if no goal is reachable. """
+        x, y, z = position
+        if z != self.z or not (0 <= x < self.width and 0 <= y < self.height):
+            return float('inf')
+        return float(self.distances[x, y])
+
+    def next_step(self, position: Tuple[int, int, int]) -> Optional[Tuple[int, int, int]]:
+        """
+        The position an agent at position should move to.
+
+        :param position: The current position of the agent.
+        :return: The next position, None if position is a goal or no goal is reachable from it.
+        """
+        x, y, z = position
+        if z != self.z or not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        dx, dy = self.directions[x, y]
+        if dx == 0 and dy == 0:
+            return None
+        return x + int(dx), y + int(dy), z
+
+    def path(self, start: Tuple[int, int, int]) -> Optional[List[Tuple[int, int, int]]]:
+        """
+        Follows the direction field from start.
+
+        :param start: The starting position.
+        :return: The positions from the one after start to the reached goal included, an empty list if start is a goal,
+                 None if no goal is reachable.
+        """
+        if start in self.goals and self.distance(start) == 0:
+            return []
+        if not np.isfinite(self.distance(start)):
+            return None
+        path = []
+        position = self.next_step(start)
+        while position is not None:
+            path.append(position)
+            position = self.next_step(position)
+        return path
+
+    def affected_by(self, position: Tuple[int, int, int]) -> bool:
+        """
+        True if a change of the movement blocker at position can change the field, i.e. position is a goal or it is
+        reachable or next to a reachable cell.
+        """
+        x, y, z = position
+        if z != self.z:
+            return False
+        if position in self.goals:
+            return True
+        window = self.distances[max(x - 1, 0):x + 2, max(y - 1, 0):y + 2]
+        return bool(np.isfinite(window).any())
+
+    def __repr__(self):
+        return f"FlowField(goals={sorted(self.goals)}, reachable={int(np.isfinite(self.distances).sum())})"
+
+
+class FlowFieldCache:
+    def __init__(self, grid_map: 'GridMap', maxsize: Optional[int] = 64):
+        """
+        Caches the flow fields of a GridMap per goal set and options. Changes of blocks_move are received through the blocks
+        listeners and only drop the fields the changed cell can affect.
+
+        :param grid_map: The GridMap whose flow fields are cached.
+        :param maxsize: Maximum number of cached fields, least recently used fields are evicted first.
+        """
+        self.grid_map = grid_map
+        self.fields = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        grid_map.add_blocks_listener(self._on_blocks_changed)
+
+    def _on_blocks_changed(self, kind: str, position: Optional[Tuple[int, int, int]]):
+        if kind != "move":
+            return
+        if position is None:
+            self.invalidations += len(self.fields)
+            self.fields.clear()
+            return
+        for key, field in self.fields.items():
+            if field.affected_by(position):
+                self.fields.pop(key)
+                self.invalidations += 1
+
+    def get(self, goals: Iterable[Tuple[int, int, int]], max_distance: Optional[float] = None,
+            diagonal_cost: float = math.sqrt(2), allow_corner_cutting: bool = True) -> FlowField:
+        """ Returns the flow field towards goals, computing it on a miss. See FlowField for the parameters. """
+        goals = frozenset(goals)
+        key: Tuple = (goals, max_distance, diagonal_cost, allow_corner_cutting)
+        field = self.fields.get(key)
+        if field is not None:
+            self.hits += 1
+            return field
+        self.misses += 1
+        field = FlowField(self.grid_map, goals, max_distance, diagonal_cost, allow_corner_cutting)
+        self.fields.put(key, field)
+        return field
+
+    def stats(self) -> Dict[str, float]:
+        """ Returns the hit/miss statistics of the cache. """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.fields),
+            "evictions": self.fields.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,9 +1,14 @@
 from typing import List, Dict
 import copy
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
 from infinipy.stateblock import StateBlock
 import uuid
 
-from infinipy.statement import Statement,CompositeStatement
+from infinipy.statement import Statement,CompositeStatement,CompiledCompositeStatement
 from infinipy.transformer import Transformer,CompositeTransformer
 from infinipy.affordance import Affordance
 from dataclasses import dataclass, field
@@ -12,7 +17,11 @@ from datetime import datetime
 from copy import deepcopy
 from infinipy.actions import Action
 from infinipy.options import Option
-from infinipy.worldstatement import WorldStatement
+from infinipy.worldstatement import WorldStatement, InternedWorldStatement
+from infinipy.instrumentation import SearchStats
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
 
 
 def print_conditions(cond_dict : dict, with_key = False):
@@ -22,6 +31,91 @@ def print_conditions(cond_dict : dict, with_key = False):
         print(value.name)
 
 
+Fact = Tuple[Tuple[Optional[str], Optional[str]], int, bool]
+
+
+class ActionIndex:
+    def __init__(self, actions: List[Action]):
+        """
+        Compiles a list of actions once into interned prerequisite and consequence worlds and builds an inverted index
+        from facts (key, statement index, value) to the actions that require or produce them.
+
+        :param actions: List of actions.
+        """
+        self.actions = list(actions)
+        self.order = {action: position for position, action in enumerate(self.actions)}
+        self.pre_worlds: Dict[Action, InternedWorldStatement] = {}
+        self.con_worlds: Dict[Action, InternedWorldStatement] = {}
+        self.requires: Dict[Fact, List[Action]] = defaultdict(list)
+        self.produces: Dict[Fact, List[Action]] = defaultdict(list)
+        for action in self.actions:
+            self.pre_worlds[action] = action.pre_world
+            self.con_worlds[action] = action.con_world
+            for fact in self.facts(self.pre_worlds[action]):
+                self.requires[fact].append(action)
+            for fact in self.facts(self.con_worlds[action]):
+                self.produces[fact].append(action)
+
+    @staticmethod
+    def facts(world: InternedWorldStatement):
+        """
+        Yields the facts of an interned world as (key, statement index, value) tuples.
+        """
+        for key, composite in world.conditions.items():
+            for index in CompiledCompositeStatement.iter_bits(composite.mask):
+                yield key, index, bool(composite.values >> index & 1)
+
+    @staticmethod
+    def changed_facts(world: InternedWorldStatement, consequences: InternedWorldStatement):
+        """
+        Yields the facts of the consequences that are not already true in the world, i.e. the facts that change when they are applied.
+        """
+        for key, composite in consequences.conditions.items():
+            current = world.conditions.get(key)
+            changed = composite.mask
+            if current is not None:
+                changed &= ~(current.mask & ~(current.values ^ composite.values))
+            for index in CompiledCompositeStatement.iter_bits(changed):
+                yield key, index, bool(composite.values >> index & 1)
+
+    def applicable_actions(self, world: InternedWorldStatement) -> List[Action]:
+        """
+        Returns the actions whose prerequisites are validated by the world, checking every action.
+        """
+        return [action for action in self.actions if world.validates(self.pre_worlds[action])]
+
+    def update_applicable(self, applicable: List[Action], world: InternedWorldStatement, new_world: InternedWorldStatement, action: Action) -> List[Action]:
+        """
+        Derives the applicable actions of new_world, obtained by applying action to world, from the applicable actions of world.
+        Only the actions that require one of the facts changed by the action are checked again.
+
+        :param applicable: The actions applicable in world.
+        :param world: The world before the action.
+        :param new_world: The world after the action.
+        :param action: The applied action.
+        :return: The actions applicable in new_world, in the original action order.
+        """
+        affected = set()
+        for key, index, value in self.changed_facts(world, self.con_worlds[action]):
+            affected.update(self.requires.get((key, index, value), ()))
+            affected.update(self.requires.get((key, index, not value), ()))
+        if not affected:
+            return applicable
+        updated = [candidate for candidate in applicable if candidate not in affected]
+        updated.extend(candidate for candidate in affected if new_world.validates(self.pre_worlds[candidate]))
+        updated.sort(key=self.order.__getitem__)
+        return updated
+
+    def producers(self, world: InternedWorldStatement) -> List[Action]:
+        """
+        Returns the actions producing at least one of the facts of the world, in the original action order.
+        """
+        found = set()
+        for fact in self.facts(world):
+            found.update(self.produces.get(fact, ()))
+        return sorted(found, key=self.order.__getitem__)
+
+
 class GOAP:
     def __init__(self, actions: List[Action]):
         """
@@ -33,61 +127,111 @@ class GOAP:
         self.terminal_world = None
         self.foward_solutions = []
         self.backward_solutions= []
+        self._action_index = None
+        self._action_index_signature = None
+        # SearchStats attached by instrumented, None keeps the planners free of any bookkeeping
+        self.stats: Optional[SearchStats] = None
+
+    @contextmanager
+    def instrumented(self, stats: Optional[SearchStats] = None):
+        """
+        Attaches a SearchStats to the planners for the duration of a with block.
+
+        :param stats: The SearchStats collecting the counters, a new one if None.
+        :return: A context manager yielding the SearchStats.
+        """
+        stats = stats if stats is not None else SearchStats()
+        previous = self.stats
+        self.stats = stats
+        if stats.time_operations:
+            stats.start_timing()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.search_time += time.perf_counter() - start
+            if stats.time_operations:
+                stats.stop_timing()
+            self.stats = previous
+
+    @property
+    def action_index(self) -> ActionIndex:
+        """
+        The compiled ActionIndex of the current actions, rebuilt only when the list of actions changes.
+        """
+        signature = tuple(id(action) for action in self.actions)
+        if signature != self._action_index_signature:
+            self._action_index = ActionIndex(self.actions)
+            self._action_index_signature = signature
+        return self._action_index
     
-    def forward_solve(self, start_state: WorldStatement, goal_state: WorldStatement):
+    def forward_solve(self, start_state: WorldStatement, goal_state: WorldStatement, max_nodes: Optional[int] = None, max_time: Optional[float] = None) -> Optional[Option]:
         """
-        Finds a solution to reach the goal state from the start state.
+        Finds the cheapest solution to reach the goal state from the start state with astar_solve.
+        The plan is also recorded in foward_solutions and terminal_world. recursive_solve is the former depth-first search.
         
         :param start_state: Starting WorldStatement.
         :param goal_state: Goal WorldStatement to achieve.
+        :param max_nodes: Maximum number of node expansions before giving up, None for no limit.
+        :param max_time: Maximum search time in seconds before giving up, None for no limit.
+        :return: An Option with the plan found, or None if no plan was found within the budget.
         """
-        self.recursive_solve(start_state, goal_state)
+        return self.astar_solve(start_state, goal_state, max_nodes=max_nodes, max_time=max_time)
 
-    def backward_solve(self, start_state: WorldStatement, goal_state: WorldStatement):
+    def backward_solve(self, start_state: WorldStatement, goal_state: WorldStatement) -> Optional[Option]:
         """
-        Finds a backward solution from the current end state to a goal starting state.
+        Finds a backward solution from the goal state to the start state with backward_recursive_solve.
+        The first solution found is returned, which is not necessarily the cheapest, see bidirectional_solve.
         
-        :param end_state: Current WorldStatement.
+        :param start_state: Starting WorldStatement.
         :param goal_state: Goal WorldStatement to achieve.
-        
+        :return: The Option found, or None if no solution was found within the default maximum depth.
         """
-
-        # current_option = Option(starting_dict=goal_state.conditions)
-        # available_actions = goal_state.available_actions(self.actions, reverse=True)
-        # print(f"Starting with the following available actions: {[action.name for action in available_actions]}")
         current_option = Option(starting_consequences=goal_state)
-        self.backward_recursive_solve(current_option, start_state,goal_state,[], visited_states=[goal_state])
+        return self.backward_recursive_solve(current_option, start_state, goal_state, visited_states=[goal_state])
     
     def recursive_solve(self,
                     current_state: WorldStatement, 
                     goal_state: WorldStatement, 
-                    current_path: List[Action] = [],
-                    visited_states: List[WorldStatement] = [],):
+                    current_path: Optional[List[Action]] = None,
+                    visited_states: Optional[List[WorldStatement]] = None,):
         """
-        Recursive function to find a solution to reach the goal state.
+        Recursive depth-first search for a solution reaching the goal state, exponential in the plan length.
+        It stops at the first solution found, which is not necessarily the cheapest, see astar_solve.
         
         :param current_state: Current WorldStatement.
         :param available_actions: List of available actions.
         :param goal_state: Goal WorldStatement to achieve.
         :param current_path: List of actions taken so far.
         """
+        current_path = current_path if current_path is not None else []
+        visited_states = visited_states if visited_states is not None else []
+        stats = self.stats
         # Base case: Check if the goal is achieved
         if goal_state.is_validated_by(current_state):
-            print("Solution found:", " -> ".join([action.name for action in current_path]))
+            logger.debug("Solution found: %s", " -> ".join([action.name for action in current_path]))
+            if stats is not None:
+                stats.solutions += 1
             self.foward_solutions.append(current_path)
             self.terminal_world = current_state
             return True
-        actions_pre_statements = [WorldStatement.from_dict(action.pre_dict) for action in self.actions]
+        action_index = self.action_index
+        actions_pre_statements = [action_index.pre_worlds[action] for action in self.actions]
         # find actions whose actions pre_statements is not falsified by the current state
         available_actions = [action for action,pre_statement in zip(self.actions,actions_pre_statements) if not current_state.falsifies(pre_statement)]
+        if stats is not None:
+            stats.expand(current_state, len(current_path), len(visited_states))
          
         # Recursive step: Try each available action
         for action in available_actions:
-            print("Trying action:", action.name)
+            logger.debug("Trying action: %s", action.name)
             new_option = Option(starting_consequences=current_state)
             new_option.append(action)
             new_world = new_option.global_consequences
-            if any([visited_state.validates(new_world) for visited_state in visited_states]):
+            visited = any([visited_state.validates(new_world) for visited_state in visited_states])
+            if stats is not None:
+                stats.generate(current_state, new_world, action.name, len(current_path) + 1, duplicate=visited)
+            if visited:
                 continue
             
             # Recurse with the updated state and path
@@ -105,60 +249,397 @@ class GOAP:
         current_option: Option, 
         start_state: WorldStatement,
         goal_state:WorldStatement, 
-        current_path: List[Action] = [],
-        visited_states: List[WorldStatement] = [],
+        current_path: Optional[List[Action]] = None,
+        visited_states: Optional[List[WorldStatement]] = None,
         max_depth: int = 10,  # Default maximum depth
       
-    ):
+    ) -> Optional[Option]:
         """
         Recursive function to find a backward solution from the goal_state to the start_state.
+        It stops at the first solution found, which is not necessarily the cheapest, see bidirectional_solve.
 
         :param current_option: Current Option with actions.
-        :param available_actions: List of available actions.
+        :param start_state: Starting WorldStatement.
         :param goal_state: Goal WorldStatement to achieve.
         :param current_path: List of actions taken so far in reverse order.
+        :param visited_states: WorldStatements already visited on the current branch.
         :param max_depth: Maximum depth of recursion allowed.
+        :return: The Option found, or None if no solution was found within max_depth.
         """
+        current_path = current_path if current_path is not None else []
+        visited_states = visited_states if visited_states is not None else []
         # Check if maximum recursion depth is reached
         if max_depth <= 0:
-            print("Maximum recursion depth reached.")
-            return False
+            logger.debug("Maximum recursion depth reached.")
+            return None
 
         # Base case: Check if the global prerequisites of the current option are satisfied by the start state
         # global_prerequisites = WorldStatement.from_dict(current_option.global_prerequisites)
         # global_consequences = WorldStatement.from_dict(current_option.global_consequences)
         global_pre = current_option.global_prerequisites
         global_con = current_option.global_consequences
+        stats = self.stats
         
         if start_state.validates(global_pre):
             current_path = [action for action in reversed(current_option.actions)]
-            print("Backward solution found:", " <- ".join([action.name for action in reversed(current_path)]))
-            print(max_depth)
+            logger.debug("Backward solution found: %s (remaining depth %d)", " <- ".join([action.name for action in reversed(current_path)]), max_depth)
+            if stats is not None:
+                stats.solutions += 1
             self.backward_solutions.append([current_path])
-            return False
+            return current_option
         
  
         
         #available actionsa are actions that do not falsify the global prerequisites
-        available_actions = [action for action in self.actions if not WorldStatement.from_dict(action.con_dict).falsifies(global_pre)]
+        action_index = self.action_index
+        available_actions = [action for action in self.actions if not action_index.con_worlds[action].falsifies(global_pre)]
+        if stats is not None:
+            stats.expand(current_option, len(current_option.actions), len(visited_states))
         #availabe actions are actions that validate the global prerequisites
         # available_actions = [action for action in self.actions if WorldStatement.from_dict(action.con_dict).validates(global_pre)]
         # Recursive step: Try each available action that does not prevent arriving to the global_pre
         for action in available_actions:
             # print("Trying action:", action.name)
-            new_option = copy.deepcopy(current_option)
-            new_option.prepend(action)
+            new_option = current_option.prepended(action)
+            if new_option is None:
+                continue
             new_pre = new_option.global_prerequisites
             new_con = new_option.global_consequences
-            if any([visited_state.validates(new_pre) for visited_state in visited_states]):
+            visited = any([visited_state.validates(new_pre) for visited_state in visited_states])
+            if stats is not None:
+                stats.generate(current_option, new_option, action.name, len(new_option.actions), duplicate=visited)
+            if visited:
                 continue
 
             
 
-            if self.backward_recursive_solve(new_option, start_state,goal_state, current_path, visited_states + [new_pre, new_con], max_depth - 1):
-                return False
+            solution = self.backward_recursive_solve(new_option, start_state,goal_state, current_path, visited_states + [new_pre, new_con], max_depth - 1)
+            if solution is not None:
+                return solution
 
-        # Return False if no solution found in this path
-        return False
+        # Return None if no solution found in this path
+        return None
+
+    def heuristic(self, world: InternedWorldStatement, goal_state: InternedWorldStatement) -> int:
+        """
+        Counts the goal conditions that are not yet satisfied by the world.
+
+        :param world: The current interned WorldStatement.
+        :param goal_state: The interned goal WorldStatement.
+        :return: The number of unsatisfied goal conditions.
+        """
+        unsatisfied = 0
+        for key, goal in goal_state.conditions.items():
+            current = world.conditions.get(key)
+            if current is None:
+                unsatisfied += goal.mask.bit_count()
+            else:
+                satisfied = current.mask & ~(current.values ^ goal.values)
+                unsatisfied += (goal.mask & ~satisfied).bit_count()
+        return unsatisfied
+
+    def admissible_heuristic(self, goal_state: InternedWorldStatement):
+        """
+        Returns a function of the world scaling heuristic so that it never overestimates the remaining plan cost:
+        no action satisfies more than k goal conditions at once and none costs less than the cheapest action.
+
+        :param goal_state: The interned goal WorldStatement.
+        :return: A callable mapping an interned world to a lower bound of the cost to reach the goal.
+        """
+        action_index = self.action_index
+        goal_facts = set(ActionIndex.facts(goal_state))
+        k = max([len(goal_facts.intersection(ActionIndex.facts(action_index.con_worlds[action]))) for action in self.actions], default=0)
+        k = max(k, 1)
+        min_cost = min([action.cost for action in self.actions], default=0.0)
+        return lambda world: -(-self.heuristic(world, goal_state) // k) * min_cost
+
+    def successors(self, world: InternedWorldStatement, applicable_cache: Optional[Dict[InternedWorldStatement, List[Action]]] = None):
+        """
+        Yields the actions whose prerequisites are validated by the world together with the resulting world.
+        When an applicable_cache is given, the applicable actions of each new world are derived incrementally from its parent
+        through the ActionIndex instead of checking every action.
+
+        :param world: The current interned WorldStatement.
+        :param applicable_cache: Optional dictionary mapping worlds to their applicable actions, shared across a search.
+        :return: A generator of (action, new_world) tuples.
+        """
+        action_index = self.action_index
+        applicable = applicable_cache.get(world) if applicable_cache is not None else None
+        if applicable is None:
+            applicable = action_index.applicable_actions(world)
+            if applicable_cache is not None:
+                applicable_cache[world] = applicable
+        for action in applicable:
+            new_world = world.force_merge(action_index.con_worlds[action], force_direction="right")
+            if applicable_cache is not None and new_world not in applicable_cache:
+                applicable_cache[new_world] = action_index.update_applicable(applicable, world, new_world, action)
+            yield action, new_world
+
+    def _build_option(self, start_state: WorldStatement, path: List[Action]) -> Option:
+        """
+        Replays a sequence of actions on a new Option starting from the start state and records it as a forward solution.
+        """
+        option = Option(starting_consequences=start_state)
+        for action in path:
+            option.append(action)
+        self.foward_solutions.append(option.actions)
+        self.terminal_world = option.global_consequences
+        return option
+
+    @staticmethod
+    def _reconstruct_path(came_from: Dict[InternedWorldStatement, Tuple[Optional[InternedWorldStatement], Optional[Action]]], world: InternedWorldStatement) -> List[Action]:
+        path = []
+        parent, action = came_from[world]
+        while parent is not None:
+            path.append(action)
+            parent, action = came_from[parent]
+        path.reverse()
+        return path
+
+    def astar_solve(self, start_state: WorldStatement, goal_state: WorldStatement, max_nodes: Optional[int] = None, max_time: Optional[float] = None) -> Optional[Option]:
+        """
+        Best-first A* search for the cheapest sequence of actions reaching the goal state.
+        Worlds are interned so the closed set is a hashed set, ties on f are broken in favour of lower h.
+        The heuristic is the number of unsatisfied goal conditions, scaled by admissible_heuristic.
+
+        :param start_state: Starting WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        :param max_nodes: Maximum number of node expansions before giving up, None for no limit.
+        :param max_time: Maximum search time in seconds before giving up, None for no limit.
+        :return: An Option with the cheapest plan found, or None if no plan was found within the budget.
+        """
+        start = InternedWorldStatement.intern(start_state)
+        goal = InternedWorldStatement.intern(goal_state)
+        deadline = time.perf_counter() + max_time if max_time is not None else None
+        heuristic = self.admissible_heuristic(goal)
+        tie = itertools.count()
+        start_h = heuristic(start)
+        open_set = [(start_h, start_h, next(tie), start)]
+        g_score = {start: 0.0}
+        came_from = {start: (None, None)}
+        closed = set()
+        applicable_cache = {}
+        expanded = 0
+        stats = self.stats
+
+        while open_set:
+            _, _, _, world = heapq.heappop(open_set)
+            if world in closed:
+                continue
+            if world.validates(goal):
+                if stats is not None:
+                    stats.solutions += 1
+                return self._build_option(start_state, self._reconstruct_path(came_from, world))
+            if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.perf_counter() > deadline):
+                return None
+            closed.add(world)
+            expanded += 1
+            if stats is not None:
+                stats.expand(world, g_score[world], len(open_set) + 1)
+
+            for action, new_world in self.successors(world, applicable_cache):
+                tentative_g_score = g_score[world] + action.cost
+                if stats is not None:
+                    stats.generate(world, new_world, action.name, tentative_g_score, duplicate=tentative_g_score >= g_score.get(new_world, float('inf')))
+                if tentative_g_score < g_score.get(new_world, float('inf')):
+                    g_score[new_world] = tentative_g_score
+                    came_from[new_world] = (world, action)
+                    closed.discard(new_world)
+                    h = heuristic(new_world)
+                    heapq.heappush(open_set, (tentative_g_score + h, h, next(tie), new_world))
+
+        return None
+
+    def ida_star_solve(self, start_state: WorldStatement, goal_state: WorldStatement, max_nodes: Optional[int] = None, max_time: Optional[float] = None) -> Optional[Option]:
+        """
+        Iterative deepening A* search, a memory-light alternative to astar_solve that keeps only the current path in memory.
+        The applicable actions of each world are derived from the ones of its parent on the path through the ActionIndex,
+        so nothing is kept for the worlds left behind.
+
+        :param start_state: Starting WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        :param max_nodes: Maximum number of node expansions before giving up, None for no limit.
+        :param max_time: Maximum search time in seconds before giving up, None for no limit.
+        :return: An Option with the cheapest plan found, or None if no plan was found within the budget.
+        """
+        start = InternedWorldStatement.intern(start_state)
+        goal = InternedWorldStatement.intern(goal_state)
+        deadline = time.perf_counter() + max_time if max_time is not None else None
+        heuristic = self.admissible_heuristic(goal)
+        path_worlds = [start]
+        path_actions = []
+        on_path = {start}
+        action_index = self.action_index
+        expanded = 0
+        stats = self.stats
+
+        def search(world: InternedWorldStatement, g: float, bound: float, parent: Optional[InternedWorldStatement] = None,
+                   parent_applicable: Optional[List[Action]] = None, parent_action: Optional[Action] = None):
+            nonlocal expanded
+            f = g + heuristic(world)
+            if f > bound:
+                return f
+            if world.validates(goal):
+                return True
+            if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.perf_counter() > deadline):
+                return None
+            expanded += 1
+            if stats is not None:
+                stats.expand(world, g, len(path_worlds))
+            # derived only for the worlds that are expanded, not for the ones pruned by the bound
+            if parent is None:
+                applicable = start_applicable
+            else:
+                applicable = action_index.update_applicable(parent_applicable, parent, world, parent_action)
+            minimum = float('inf')
+            for action in applicable:
+                new_world = world.force_merge(action_index.con_worlds[action], force_direction="right")
+                if stats is not None:
+                    stats.generate(world, new_world, action.name, g + action.cost, duplicate=new_world in on_path)
+                if new_world in on_path:
+                    continue
+                path_worlds.append(new_world)
+                path_actions.append(action)
+                on_path.add(new_world)
+                result = search(new_world, g + action.cost, bound, world, applicable, action)
+                if result is True or result is None:
+                    return result
+                minimum = min(minimum, result)
+                on_path.discard(path_worlds.pop())
+                path_actions.pop()
+            return minimum
+
+        start_applicable = action_index.applicable_actions(start)
+        bound = heuristic(start)
+        while True:
+            result = search(start, 0.0, bound)
+            if result is True:
+                if stats is not None:
+                    stats.solutions += 1
+                return self._build_option(start_state, path_actions)
+            if result is None or result == float('inf'):
+                return None
+            bound = result
+
+    def bidirectional_solve(self, start_state: WorldStatement, goal_state: WorldStatement, max_nodes: Optional[int] = None, max_time: Optional[float] = None) -> Optional[Option]:
+        """
+        Bidirectional uniform-cost search meeting in the middle.
+        The forward frontier grows Options from the start state with Option.appended, the backward frontier grows Options from
+        the goal state with Option.prepended using only actions that produce one of the still required facts.
+        Backward frontier Options are bucketed by one of their prerequisite facts and forward worlds by all of their facts,
+        so a meeting, i.e. a forward world validating the prerequisites of a backward Option, is found through hashed lookups.
+        The two halves are spliced into a single Option, and the search stops when the cheapest frontier costs exceed the best splice.
+
+        :param start_state: Starting WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        :param max_nodes: Maximum number of node expansions, summed over both directions, None for no limit.
+        :param max_time: Maximum search time in seconds, None for no limit.
+        :return: The cheapest spliced Option found, or None if no plan was found within the budget.
+        """
+        start = InternedWorldStatement.intern(start_state)
+        goal = InternedWorldStatement.intern(goal_state)
+        action_index = self.action_index
+        deadline = time.perf_counter() + max_time if max_time is not None else None
+        tie = itertools.count()
+        applicable_cache = {}
+
+        forward_root = Option(starting_consequences=start)
+        backward_root = Option(starting_consequences=goal)
+        forward_open = [(0.0, next(tie), forward_root)]
+        backward_open = [(0.0, next(tie), backward_root)]
+        forward_g = {start: 0.0}
+        backward_g = {goal: 0.0}
+        forward_by_fact = defaultdict(list)
+        forward_all = []
+        backward_buckets = defaultdict(list)
+        best = None
+        best_cost = float('inf')
+        expanded = 0
+        stats = self.stats
+
+        def splice(forward_option: Option, forward_cost: float, backward_option: Option, backward_cost: float):
+            nonlocal best, best_cost
+            if forward_cost + backward_cost >= best_cost:
+                return
+            option = forward_option
+            for action in backward_option.actions:
+                option = option.appended(action)
+                if option is None:
+                    return
+            if option.global_consequences.validates(goal):
+                best, best_cost = option, forward_cost + backward_cost
+
+        def register_forward(option: Option, cost: float):
+            world = option.global_consequences
+            entry = (option, cost)
+            forward_all.append(entry)
+            for fact in ActionIndex.facts(world):
+                forward_by_fact[fact].append(entry)
+                for backward_option, backward_cost in backward_buckets.get(fact, ()):
+                    if world.validates(backward_option.global_prerequisites):
+                        splice(option, cost, backward_option, backward_cost)
+            for backward_option, backward_cost in backward_buckets.get(None, ()):
+                splice(option, cost, backward_option, backward_cost)
+
+        def register_backward(option: Option, cost: float):
+            prerequisites = option.global_prerequisites
+            signature = next(ActionIndex.facts(prerequisites), None)
+            backward_buckets[signature].append((option, cost))
+            candidates = forward_by_fact.get(signature, ()) if signature is not None else forward_all
+            for forward_option, forward_cost in candidates:
+                if forward_option.global_consequences.validates(prerequisites):
+                    splice(forward_option, forward_cost, option, cost)
+
+        register_backward(backward_root, 0.0)
+        register_forward(forward_root, 0.0)
 
+        # the forward search is complete on its own, once it is exhausted no further plan can be spliced
+        while forward_open:
+            lower_bound = forward_open[0][0] + (backward_open[0][0] if backward_open else 0.0)
+            if lower_bound >= best_cost:
+                break
+            if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.perf_counter() > deadline):
+                break
+            expanded += 1
+            if not backward_open or len(forward_open) <= len(backward_open):
+                cost, _, option = heapq.heappop(forward_open)
+                world = option.global_consequences
+                if cost > forward_g[world]:
+                    continue
+                if stats is not None:
+                    stats.expand(world, cost, len(forward_open) + len(backward_open) + 1)
+                for action, new_world in self.successors(world, applicable_cache):
+                    new_cost = cost + action.cost
+                    if stats is not None:
+                        stats.generate(world, new_world, action.name, new_cost, duplicate=new_cost >= forward_g.get(new_world, float('inf')))
+                    if new_cost < forward_g.get(new_world, float('inf')):
+                        forward_g[new_world] = new_cost
+                        new_option = option.appended(action)
+                        register_forward(new_option, new_cost)
+                        heapq.heappush(forward_open, (new_cost, next(tie), new_option))
+            else:
+                cost, _, option = heapq.heappop(backward_open)
+                prerequisites = option.global_prerequisites
+                if cost > backward_g[prerequisites]:
+                    continue
+                if stats is not None:
+                    stats.expand(prerequisites, cost, len(forward_open) + len(backward_open) + 1)
+                for action in action_index.producers(prerequisites):
+                    if action_index.con_worlds[action].falsifies(prerequisites):
+                        continue
+                    new_option = option.prepended(action)
+                    new_cost = cost + action.cost
+                    new_prerequisites = new_option.global_prerequisites
+                    if stats is not None:
+                        stats.generate(prerequisites, new_prerequisites, action.name, new_cost, duplicate=new_cost >= backward_g.get(new_prerequisites, float('inf')))
+                    if new_cost < backward_g.get(new_prerequisites, float('inf')):
+                        backward_g[new_prerequisites] = new_cost
+                        register_backward(new_option, new_cost)
+                        heapq.heappush(backward_open, (new_cost, next(tie), new_option))
 
+        if best is not None:
+            if stats is not None:
+                stats.solutions += 1
+            self.foward_solutions.append(best.actions)
+            self.terminal_world = best.global_consequences
+        return best
@@ -1,14 +1,35 @@
 from infinipy.worldstatement import WorldStatement
 from infinipy.stateblock import StateBlock
 from infinipy.statement import Statement,CompositeStatement
-from typing import Dict, List, Tuple, Optional
+from infinipy.utils import LRUCache
+from infinipy.allpairs import AllPairsPaths
+from typing import Dict, List, Tuple, Optional, Iterable
+from collections import deque
+import threading
 import heapq
 import math
 #l
 
 
 class GridStatement:
-    def __init__(self, WorldStatement: WorldStatement, spatial_registry: dict,statement_registry:Dict[str,Statement] ):
+    def __init__(self, WorldStatement: WorldStatement, spatial_registry: dict,statement_registry:Dict[str,Statement],
+                 lazy: bool = False, cache_size: Optional[int] = 65536, warm_up: bool = False):
+        """
+        Grid view of a WorldStatement, answering movement, path and line of sight queries over the cells of spatial_registry.
+
+        By default every path, distance and ray between two cells is precomputed, which takes O(N^2) memory for N cells.
+        In lazy mode nothing is precomputed: paths and rays are computed on first request and kept in bounded LRU caches,
+        distances are computed directly. The paths are cached per start as the parents of a breadth first search, O(N) each,
+        and rebuilt on request. A background warm-up can fill the path cache ahead of the queries, see warm_up.
+
+        :param WorldStatement: The WorldStatement describing the entities.
+        :param spatial_registry: The statements of the positions keyed by (x, y).
+        :param statement_registry: The statements by name, blocks_los_is_true and blocks_move_is_true are used.
+        :param lazy: If True, paths and rays are computed on demand instead of for every pair of cells.
+        :param cache_size: Maximum number of cached paths and of cached rays in lazy mode, None for no limit. The paths are
+                           cached by start, a start holding the paths to every cell, so at least one start is always kept.
+        :param warm_up: If True in lazy mode, the path cache is filled by a background thread right away.
+        """
         self.worldstatement = WorldStatement
         self.spatial_registry = spatial_registry
         self.position_dict = self.create_position_dict()
@@ -17,9 +38,21 @@ class GridStatement:
         self.move_dict = self.create_move_dict()
         self.max_height = max([pos[1] for pos in self.spatial_registry.keys()])
         self.max_width = max([pos[0] for pos in self.spatial_registry.keys()])
-        self.path_dict = self.create_path_dict()
-        self.distance_dict = self.create_distance_dict()
-        self.ray_dict = self.precompute_rays()
+        self.lazy = lazy
+        self._warm_up_thread: Optional[threading.Thread] = None
+        self._stop_warm_up = threading.Event()
+        if lazy:
+            self.path_dict = None
+            self.distance_dict = None
+            self.ray_dict = None
+            self.path_cache = LRUCache(None if cache_size is None else max(1, cache_size // len(spatial_registry)))
+            self.ray_cache = LRUCache(cache_size)
+            if warm_up:
+                self.warm_up()
+        else:
+            self.path_dict = self.create_path_dict()
+            self.distance_dict = self.create_distance_dict()
+            self.ray_dict = self.precompute_rays()
 
     def blocks_move(self,position:Tuple[int,int])->bool:
         return self.move_dict[position]
@@ -74,14 +107,94 @@ class GridStatement:
     def create_path_dict(self):
         path_dict = {}
         for pos_start in self.spatial_registry.keys():
+            parents = self.paths_from(pos_start)
             for pos_end in self.spatial_registry.keys():
-                if (pos_end,pos_start) in path_dict:
-                    path_dict[(pos_start,pos_end)] = path_dict[(pos_end,pos_start)]
-                elif pos_start == pos_end:
-                    path_dict[(pos_start,pos_end)] = []
-                else:
-                    path_dict[(pos_start,pos_end)] = self.a_star(pos_start,pos_end)
+                path_dict[(pos_start,pos_end)] = self.rebuild_path(parents, pos_end)
         return path_dict
+
+    def paths_from(self, start: Tuple[int, int], allow_diagonal: bool = True) -> Dict[Tuple[int, int], Optional[Tuple[int, int]]]:
+        """
+        Shortest paths from start to every reachable cell with a single breadth first search, moves have uniform cost.
+
+        :param start: The starting position.
+        :param allow_diagonal: If True, diagonal moves are allowed.
+        :return: The parent of every reachable cell on its shortest path, None for start itself, see rebuild_path.
+        """
+        parents: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {start: None}
+        frontier = deque([start])
+        while frontier:
+            current = frontier.popleft()
+            for neighbor in self.get_neighbors(current, allow_diagonal, allow_blocks_move = False):
+                if neighbor not in parents:
+                    parents[neighbor] = current
+                    frontier.append(neighbor)
+        return parents
+
+    @staticmethod
+    def rebuild_path(parents: Dict[Tuple[int, int], Optional[Tuple[int, int]]], end: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """
+        Rebuilds the path to end from the parents returned by paths_from.
+
+        :return: The cells from the one after start to end included, an empty list if end is start, None if end is not reachable.
+        """
+        if end not in parents:
+            return None
+        path = []
+        while parents[end] is not None:
+            path.append(end)
+            end = parents[end]
+        path.reverse()
+        return path
+
+    def get_path(self, start: Tuple[int, int], end: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """
+        The path from start to end, from the position after start to end included, or None if end is not reachable.
+        In lazy mode a miss runs paths_from(start), the same breadth first search as the eager mode and the warm-up, and caches
+        its parents, from which the paths from start to every cell are rebuilt.
+        """
+        if not self.lazy:
+            return self.path_dict.get((start, end))
+        parents = self.path_cache.get(start)
+        if parents is None:
+            parents = self.paths_from(start)
+            self.path_cache.put(start, parents)
+        return self.rebuild_path(parents, end)
+
+    def warm_up(self, sources: Optional[Iterable[Tuple[int, int]]] = None, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Fills the path cache of the lazy mode with one breadth first search per source, each caching the paths to every cell.
+        The warm-up stops when the cache is full, so that it never evicts paths that were actually requested.
+
+        :param sources: The starting positions to warm up, every cell of the spatial registry by default.
+        :param background: If True, the warm-up runs in a daemon thread that is returned, otherwise it runs before returning.
+        :return: The warm-up thread, or None if background is False.
+        """
+        if not self.lazy:
+            raise ValueError("warm_up is only available in lazy mode")
+        self.stop_warm_up()
+        self._stop_warm_up.clear()
+        sources = list(self.spatial_registry.keys() if sources is None else sources)
+        if not background:
+            self._warm_up(sources)
+            return None
+        self._warm_up_thread = threading.Thread(target=self._warm_up, args=(sources,), daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def _warm_up(self, sources: List[Tuple[int, int]]):
+        cache = self.path_cache
+        for source in sources:
+            if self._stop_warm_up.is_set() or (cache.maxsize is not None and len(cache) >= cache.maxsize):
+                return
+            if source not in cache:
+                cache.put(source, self.paths_from(source))
+
+    def stop_warm_up(self):
+        """ Stops the background warm-up, if any, and waits for its thread to finish. """
+        if self._warm_up_thread is not None:
+            self._stop_warm_up.set()
+            self._warm_up_thread.join()
+            self._warm_up_thread = None
     
     def create_distance_dict(self):
         distance_dict = {}
@@ -93,7 +206,8 @@ class GridStatement:
                     distance_dict[(key,key2)] = self.distance(key,key2)
                 else:
                     distance_dict[(key,key2)] = 0
-                    
+        return distance_dict
+
     def create_cansee_dict(self):
         cansee_dict = {}
         for pos_start in self.spatial_registry.keys():
@@ -164,7 +278,9 @@ class GridStatement:
 
         while unvisited:
             current_distance, current_position = heapq.heappop(unvisited)
-            if current_distance > max_distance:
+            if current_distance > distances[current_position]:
+                continue  # stale entry, the position was reached again with a shorter distance
+            if current_distance >= max_distance:
                 continue
 
             for neighbor in self.get_neighbors(current_position, allow_diagonal,allow_blocks_move = False):
@@ -175,50 +291,22 @@ class GridStatement:
 
         return distances
     
+    def all_pairs(self, allow_diagonal: bool = False, method: str = "bfs", allow_blocks_move: bool = False) -> AllPairsPaths:
+        """
+        All-pairs shortest paths between the cells of the grid, stored as int32 distance and next-hop arrays.
+        Only meant for small tactical maps, the arrays take O(N^2) memory for N cells.
+
+        :param allow_diagonal: If True, diagonal moves are allowed.
+        :param method: "bfs" for one breadth first search per cell or "floyd_warshall", see AllPairsPaths.
+        :param allow_blocks_move: If True, cells blocking movement can be entered like any other cell.
+        :return: The AllPairsPaths, indexed in the order x * height + y.
+        """
+        cells = [(x, y) for x in range(self.max_width + 1) for y in range(self.max_height + 1)]
+        return AllPairsPaths(cells, lambda cell: self.get_neighbors(cell, allow_diagonal=allow_diagonal, allow_blocks_move=allow_blocks_move), method)
+
     def floyd_warshall(self, allows_diagonal: bool = False):
-        grid_size = (self.max_width+1, self.max_height+1)
-        num_vertices = grid_size[0] * grid_size[1]
-        inf = float('inf')
-
-        # Initialize distance and path matrices
-        dist = [[inf] * num_vertices for _ in range(num_vertices)]
-        path = [[-1] * num_vertices for _ in range(num_vertices)]
-
-        # Initialize distances for adjacent nodes and same node
-        for x in range(grid_size[0]):
-            for y in range(grid_size[1]):
-                idx = x * grid_size[1] + y
-                dist[idx][idx] = 0  # Distance to self is zero
-
-                # Use get_neighbors to determine moveable neighbors
-                neighbors = self.get_neighbors((x, y), allow_diagonal=allows_diagonal, allow_blocks_move=True)
-                for nx, ny in neighbors:
-                    neighbor_idx = nx * grid_size[1] + ny
-                    dist[idx][neighbor_idx] = 1  # Distance to moveable neighbor is 1
-                    path[idx][neighbor_idx] = neighbor_idx
-
-        # Floyd-Warshall algorithm
-        for k in range(num_vertices):
-            for i in range(num_vertices):
-                for j in range(num_vertices):
-                    if dist[i][k] + dist[k][j] < dist[i][j]:
-                        dist[i][j] = dist[i][k] + dist[k][j]
-                        path[i][j] = path[i][k]
-
-        # Reconstruct paths and create dictionary
-        paths_dict = {}
-        for i in range(num_vertices):
-            for j in range(num_vertices):
-                if i != j and path[i][j] != -1:
-                    start_pos = (i // grid_size[1], i % grid_size[1])
-                    end_pos = (j // grid_size[1], j % grid_size[1])
-                    path_sequence = []
-                    while i != j:
-                        i = path[i][j]
-                        path_sequence.append((i // grid_size[1], i % grid_size[1]))
-                    paths_dict[(start_pos, end_pos)] = path_sequence
-
-        return paths_dict
+        """ Every shortest path keyed by (start, end), see all_pairs for the array based version. """
+        return self.all_pairs(allows_diagonal, method="floyd_warshall", allow_blocks_move=True).paths_dict()
     
     def cast_light(self, origin: Tuple[int, int], max_radius: int, angle: float) -> List[Tuple[int, int, int]]:
         x0, y0 = origin
@@ -254,7 +342,15 @@ class GridStatement:
         return line_points
     
     def line(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
-        return self.ray_dict.get((start, end), [])
+        if not self.lazy:
+            return self.ray_dict.get((start, end), [])
+        if start == end or start not in self.spatial_registry or end not in self.spatial_registry:
+            return []
+        ray = self.ray_cache.get((start, end))
+        if ray is None:
+            ray = self.compute_ray(start, end)
+            self.ray_cache.put((start, end), ray)
+        return ray
 
     def line_of_sight(self, start: Tuple[int, int], end: Tuple[int, int]) -> Tuple[bool, List[Tuple[int, int]]]:
         line_points = self.line(start, end)
@@ -281,6 +377,9 @@ class GridStatement:
         return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2)
     
     def get_distance(self, start: Tuple[int, int], end: Tuple[int, int]) -> int:
+        if self.lazy:
+            # cheaper to compute than to look up in a cache
+            return self.distance(start, end)
         return self.distance_dict[(start,end)]
     
     def precompute_rays(self):
@@ -0,0 +1,473 @@
+from typing import Dict, List, Tuple, Optional, Set, Iterator, TYPE_CHECKING
+import heapq
+import math
+import numpy as np
+from infinipy.utils import LRUCache
+if TYPE_CHECKING:
+    from infinipy.gridmap import GridMap
+
+Cell = Tuple[int, int]
+Cluster = Tuple[int, int]
+
+# an entrance shorter than this gets a single transition in its middle, longer ones get one at each end
+MAX_SINGLE_TRANSITION_ENTRANCE = 6
+
+# the eight moves as (dx, dy)
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+class HierarchicalPathfinder:
+    def __init__(self, grid_map: 'GridMap', cluster_size: int = 16, z: int = 0, diagonal_cost: float = math.sqrt(2),
+                 endpoint_cache_size: int = 1024, heuristic_weight: float = 1.2):
+        """
+        HPA* over the blocks_move grid of one z level of a GridMap, for 8-connected moves without corner cutting.
+
+        The map is split into square clusters. Along the border of two adjacent clusters every maximal run of cells free on
+        both sides is an entrance, represented by one or two transitions, i.e. pairs of facing cells. The transition cells are the
+        nodes of the abstract graph, linked by a step of cost 1 across the border and by the shortest path cost inside their cluster.
+        Queries connect start and goal to the nodes of their clusters, search the abstract graph and refine the abstract path
+        lazily, one abstract edge at a time, from the distance maps kept for the intra-cluster paths.
+
+        Nothing is built up front: the borders and the distance maps of a cluster, computed for all its nodes at once with
+        array relaxations, are built the first time a search reaches the cluster and kept until blocks_move changes in it.
+        The first query through a region pays for its clusters, a few milliseconds each, the later ones only search the
+        abstract graph. When blocks_move changes, only the cluster of the cell, and the neighbouring clusters if the
+        transitions of their common border change, are dropped.
+
+        The abstract search is weighted by heuristic_weight, which bounds the cost of the abstract path to that factor of the
+        best abstract path while expanding far fewer nodes on large maps. The refined path is then smoothed around each
+        transition, replacing the detours caused by crossing borders at fixed cells with straight octile walks when they
+        are free, so paths are usually within a few percent of the optimal ones.
+
+        :param grid_map: The GridMap providing blocks_move_grid, changes are received through its blocks listeners.
+        :param cluster_size: The side of the square clusters in cells.
+        :param z: The z level searched.
+        :param diagonal_cost: The cost of a diagonal step, straight steps cost 1.
+        :param endpoint_cache_size: Number of query endpoints whose links to the abstract graph are kept, e.g. NPC positions.
+        :param heuristic_weight: Weight of the heuristic of the abstract search, at least 1, 1 for the best abstract path.
+        """
+        if heuristic_weight < 1:
+            raise ValueError("heuristic_weight must be at least 1")
+        self.grid_map = grid_map
+        self.cluster_size = cluster_size
+        self.z = z
+        self.diagonal_cost = diagonal_cost
+        self.heuristic_weight = heuristic_weight
+        self.width, self.height = grid_map.map_size
+        self.columns = -(-self.width // cluster_size)
+        self.rows = -(-self.height // cluster_size)
+        self._blocked = None
+        self._grid: Optional[np.ndarray] = None
+        # transitions of the border between a cluster and its east (+x) or south (+y) neighbour, built on demand
+        self._borders: Dict[Tuple[Cluster, Cluster], List[Tuple[Cell, Cell]]] = {}
+        self._cluster_nodes: Dict[Cluster, List[Cell]] = {}
+        self._inter: Dict[Cell, Set[Cell]] = {}
+        # per built cluster, the index of each node and for every cell of the cluster the direction of its next step
+        # towards each node, an index of DIRECTIONS or -1, so that intra-cluster paths are refined by following it
+        self._next_steps: Dict[Cluster, Tuple[Dict[Cell, int], np.ndarray]] = {}
+        # intra and inter edges of the nodes of the built clusters, the abstract graph searched by the queries
+        self._adjacent: Dict[Cell, List[Tuple[Cell, float]]] = {}
+        self._cluster_versions: Dict[Cluster, int] = {}
+        # costs from query endpoints to the nodes of their cluster and their next steps, keyed by (cell, cluster version)
+        self._endpoint_cache = LRUCache(endpoint_cache_size)
+        self._dirty: Set[Cluster] = set()
+        self.rebuilt_clusters = 0
+        grid_map.add_blocks_listener(self._on_blocks_changed)
+
+    def _on_blocks_changed(self, kind: str, position: Optional[Tuple[int, int, int]]):
+        if kind != "move":
+            return
+        self._blocked = None
+        if position is None:
+            self._dirty.update(self._cluster_nodes)
+            self._dirty.update(cluster for border in self._borders for cluster in border)
+            return
+        x, y, z = position
+        if z != self.z:
+            return
+        self._dirty.add(self.cluster_of((x, y)))
+
+    def cluster_of(self, cell: Cell) -> Cluster:
+        return cell[0] // self.cluster_size, cell[1] // self.cluster_size
+
+    def cluster_bounds(self, cluster: Cluster) -> Tuple[int, int, int, int]:
+        """ Returns (x_min, y_min, x_max, y_max) of a cluster, maxima excluded. """
+        x_min, y_min = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return x_min, y_min, min(x_min + self.cluster_size, self.width), min(y_min + self.cluster_size, self.height)
+
+    def free(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height and not self._blocked[x * self.height + y]
+
+    def _refresh(self):
+        """ Takes a snapshot of the blockers and drops what the changed cells invalidated. """
+        if self._blocked is None:
+            self._blocked = self.grid_map.blocks_move_grid[:, :, self.z].tobytes()
+            self._grid = np.frombuffer(self._blocked, dtype=bool).reshape(self.width, self.height)
+        if not self._dirty:
+            return
+        dirty = self._dirty
+        self._dirty = set()
+        for cluster in dirty:
+            self._drop_cluster(cluster)
+            cx, cy = cluster
+            for border in (((cx - 1, cy), cluster), ((cx, cy - 1), cluster), (cluster, (cx + 1, cy)), (cluster, (cx, cy + 1))):
+                # only the borders already built can have nodes in the built neighbouring clusters
+                if border in self._borders and self._build_border(border):
+                    self._drop_cluster(border[0] if border[1] == cluster else border[1])
+
+    def _drop_cluster(self, cluster: Cluster):
+        for node in self._cluster_nodes.pop(cluster, ()):
+            self._adjacent.pop(node, None)
+        self._next_steps.pop(cluster, None)
+        self._cluster_versions[cluster] = self._cluster_versions.get(cluster, 0) + 1
+
+    def _build_border(self, border: Tuple[Cluster, Cluster]) -> bool:
+        """ Computes the transitions of a border, returns True if they changed. """
+        first, second = border
+        x_min, y_min, x_max, y_max = self.cluster_bounds(first)
+        if second[0] > first[0]:
+            # vertical border, facing cells (x_max - 1, y) and (x_max, y)
+            pairs = [((x_max - 1, y), (x_max, y)) for y in range(y_min, y_max)]
+        else:
+            pairs = [((x, y_max - 1), (x, y_max)) for x in range(x_min, x_max)]
+        transitions = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and self.free(*pair[0]) and self.free(*pair[1]):
+                run.append(pair)
+                continue
+            if run:
+                if len(run) < MAX_SINGLE_TRANSITION_ENTRANCE:
+                    transitions.append(run[len(run) // 2])
+                else:
+                    transitions.extend((run[0], run[-1]))
+                run = []
+        old = self._borders.get(border)
+        if transitions == old:
+            return False
+        for a, b in old or ():
+            self._inter.get(a, set()).discard(b)
+            self._inter.get(b, set()).discard(a)
+        for a, b in transitions:
+            self._inter.setdefault(a, set()).add(b)
+            self._inter.setdefault(b, set()).add(a)
+        self._borders[border] = transitions
+        return True
+
+    def nodes(self, cluster: Cluster) -> List[Cell]:
+        """ The transition cells of a cluster, building the borders of the cluster if needed. """
+        nodes = self._cluster_nodes.get(cluster)
+        if nodes is None:
+            nodes = set()
+            cx, cy = cluster
+            for border in (((cx - 1, cy), cluster), ((cx, cy - 1), cluster), (cluster, (cx + 1, cy)), (cluster, (cx, cy + 1))):
+                if not (0 <= border[0][0] and 0 <= border[0][1] and border[1][0] < self.columns and border[1][1] < self.rows):
+                    continue
+                if border not in self._borders:
+                    self._build_border(border)
+                for a, b in self._borders[border]:
+                    nodes.add(a if self.cluster_of(a) == cluster else b)
+            nodes = sorted(nodes)
+            self._cluster_nodes[cluster] = nodes
+        return nodes
+
+    def _build_cluster(self, cluster: Cluster):
+        """ Computes the paths from every node of a cluster to its cells and the abstract edges of its nodes. """
+        nodes = self.nodes(cluster)
+        x_min, y_min, _, _ = self.cluster_bounds(cluster)
+        distances, next_steps = self._distance_maps(cluster, nodes)
+        self._next_steps[cluster] = ({node: k for k, node in enumerate(nodes)}, next_steps)
+        infinity = float('inf')
+        for k, node in enumerate(nodes):
+            edges = []
+            for other in nodes:
+                if other != node:
+                    cost = float(distances[k, other[0] - x_min, other[1] - y_min])
+                    if cost < infinity:
+                        edges.append((other, cost))
+            edges.extend((other, 1.0) for other in self._inter.get(node, ()))
+            self._adjacent[node] = edges
+        self.rebuilt_clusters += 1
+
+    def _edges(self, node: Cell) -> List[Tuple[Cell, float]]:
+        edges = self._adjacent.get(node)
+        if edges is None:
+            self._build_cluster(self.cluster_of(node))
+            edges = self._adjacent[node]
+        return edges
+
+    def _distance_maps(self, cluster: Cluster, sources: List[Cell]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Shortest paths from each source to every cell of the cluster, moving inside the cluster only.
+        All sources are relaxed together, one array operation per move direction, until nothing changes.
+
+        :return: The costs, an array of shape (len(sources), cluster width, cluster height) with inf for the unreachable cells,
+                 and for each cell the index in DIRECTIONS of its next step towards the source, -1 at the source or if unreachable.
+        """
+        x_min, y_min, x_max, y_max = self.cluster_bounds(cluster)
+        width, height = x_max - x_min, y_max - y_min
+        free = ~self._grid[x_min:x_max, y_min:y_max]
+        distances = np.full((len(sources), width, height), np.inf)
+        for k, (x, y) in enumerate(sources):
+            distances[k, x - x_min, y - y_min] = 0.0
+        moves = []
+        for dx, dy in DIRECTIONS:
+            source_x = slice(max(0, -dx), width - max(0, dx))
+            source_y = slice(max(0, -dy), height - max(0, dy))
+            target_x = slice(max(0, dx), width - max(0, -dx))
+            target_y = slice(max(0, dy), height - max(0, -dy))
+            allowed = free[source_x, source_y] & free[target_x, target_y]
+            if dx and dy:
+                # no corner cutting, both straight cells of a diagonal step are free
+                allowed &= free[target_x, source_y] & free[source_x, target_y]
+            if not allowed.any():
+                continue
+            step = np.where(allowed, self.diagonal_cost if dx and dy else 1.0, np.inf)
+            source, target = (slice(None), source_x, source_y), (slice(None), target_x, target_y)
+            moves.append((DIRECTIONS.index((-dx, -dy)), source, target, distances[source], distances[target], step,
+                          np.empty(distances[target].shape)))
+        previous = np.empty_like(distances)
+        while True:
+            np.copyto(previous, distances)
+            for _, _, _, source_distances, target_distances, step, buffer in moves:
+                np.add(source_distances, step, out=buffer)
+                np.minimum(target_distances, buffer, out=target_distances)
+            if np.array_equal(previous, distances):
+                break
+        # the minimum stored the exact sum, so the next step of a cell is a move back along which the sum matches
+        next_steps = np.full(distances.shape, -1, dtype=np.int8)
+        unassigned = distances > 0
+        for back, _, target, source_distances, target_distances, step, buffer in moves:
+            np.add(source_distances, step, out=buffer)
+            matches = unassigned[target] & (buffer == target_distances)
+            next_steps[target][matches] = back
+            unassigned[target][matches] = False
+        return distances, next_steps
+
+    def _endpoint(self, cell: Cell) -> Tuple[Dict[Cell, float], List[List[float]], List[List[int]]]:
+        """
+        Costs from a cell to the reachable nodes of its cluster, and the costs and next steps of the cells of the cluster
+        towards it, cached.
+        """
+        cluster = self.cluster_of(cell)
+        key = (cell, self._cluster_versions.get(cluster, 0))
+        cached = self._endpoint_cache.get(key)
+        if cached is None:
+            x_min, y_min, _, _ = self.cluster_bounds(cluster)
+            distances, next_steps = self._distance_maps(cluster, [cell])
+            edges = {}
+            for node in self.nodes(cluster):
+                cost = float(distances[0, node[0] - x_min, node[1] - y_min])
+                if node != cell and cost < float('inf'):
+                    edges[node] = cost
+            cached = (edges, distances[0].tolist(), next_steps[0].tolist())
+            self._endpoint_cache.put(key, cached)
+        return cached
+
+    def _octile(self, a: Cell, b: Cell) -> float:
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return dx + dy + (min(self.diagonal_cost, 2.0) - 2) * min(dx, dy)
+
+    def find_abstract_path(self, start: Tuple[int, int, int], goal: Tuple[int, int, int]) -> Optional[Tuple[List[Cell], float]]:
+        """
+        Searches the abstract graph between two positions of the z level, building the clusters it reaches.
+
+        :param start: The starting position.
+        :param goal: The goal position.
+        :return: A tuple (waypoints from start to goal, cost of the unrefined path), or None if there is no path.
+        """
+        self._refresh()
+        start_cell, goal_cell = (start[0], start[1]), (goal[0], goal[1])
+        if start[2] != self.z or goal[2] != self.z or not self.free(*start_cell) or not self.free(*goal_cell):
+            return None
+        start_edges, _, _ = self._endpoint(start_cell)
+        goal_edges, goal_distances, _ = self._endpoint(goal_cell)
+        if self.cluster_of(start_cell) == self.cluster_of(goal_cell):
+            x_min, y_min, _, _ = self.cluster_bounds(self.cluster_of(goal_cell))
+            direct = goal_distances[start_cell[0] - x_min][start_cell[1] - y_min]
+            if direct < float('inf'):
+                start_edges = dict(start_edges)
+                start_edges[goal_cell] = direct
+
+        gx, gy = goal_cell
+        diagonal_saving = (min(self.diagonal_cost, 2.0) - 2) * self.heuristic_weight
+        weight = self.heuristic_weight
+        adjacent = self._adjacent
+        infinity = float('inf')
+        start_h = self._octile(start_cell, goal_cell) * weight
+        open_set = [(start_h, start_h, start_cell)]
+        g_score = {start_cell: 0.0}
+        came_from: Dict[Cell, Cell] = {}
+        closed = set()
+        while open_set:
+            _, _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            if current == goal_cell:
+                waypoints = [current]
+                while current in came_from:
+                    current = came_from[current]
+                    waypoints.append(current)
+                waypoints.reverse()
+                return waypoints, g_score[goal_cell]
+            closed.add(current)
+            if current == start_cell:
+                edges = list(start_edges.items()) + [(other, 1.0) for other in self._inter.get(current, ())]
+            else:
+                edges = adjacent.get(current)
+                if edges is None:
+                    edges = self._edges(current)
+                if current in goal_edges:
+                    edges = edges + [(goal_cell, goal_edges[current])]
+            current_g = g_score[current]
+            for neighbour, cost in edges:
+                if neighbour in closed:
+                    continue
+                tentative_g_score = current_g + cost
+                if tentative_g_score < g_score.get(neighbour, infinity):
+                    g_score[neighbour] = tentative_g_score
+                    came_from[neighbour] = current
+                    # weighted octile distance, inlined
+                    dx, dy = neighbour[0] - gx, neighbour[1] - gy
+                    dx, dy = (dx if dx > 0 else -dx), (dy if dy > 0 else -dy)
+                    h = (dx + dy) * weight + diagonal_saving * (dx if dx < dy else dy)
+                    heapq.heappush(open_set, (tentative_g_score + h, h, neighbour))
+        return None
+
+    def iter_path(self, start: Tuple[int, int, int], goal: Tuple[int, int, int]) -> Optional[Iterator[Tuple[int, int, int]]]:
+        """
+        Finds a path and refines and smooths it lazily, one abstract edge at a time, as the positions are consumed.
+
+        :param start: The starting position.
+        :param goal: The goal position.
+        :return: An iterator over the positions from the one after start to goal included, or None if there is no path.
+        """
+        if start == goal:
+            return iter(())
+        result = self.find_abstract_path(start, goal)
+        if result is None:
+            return None
+        waypoints, _ = result
+        z = self.z
+        return ((x, y, z) for x, y in self._smooth(waypoints[0], self._refine(waypoints)))
+
+    def _refine(self, waypoints: List[Cell]) -> Iterator[Tuple[List[Cell], bool]]:
+        """
+        Yields the cells of each abstract edge, from the cell after its first waypoint to its second one included, and
+        whether the edge is a border crossing.
+        """
+        goal = waypoints[-1]
+        last = len(waypoints) - 2
+        for index, (a, b) in enumerate(zip(waypoints, waypoints[1:])):
+            cluster = self.cluster_of(a)
+            if cluster != self.cluster_of(b):
+                yield [b], True
+            elif index == last:
+                yield self._follow(self._endpoint(goal)[2], cluster, a), False
+            else:
+                if cluster not in self._next_steps:
+                    self._build_cluster(cluster)
+                node_index, next_steps = self._next_steps[cluster]
+                yield self._follow(next_steps[node_index[b]].tolist(), cluster, a), False
+
+    def _follow(self, next_steps: List[List[int]], cluster: Cluster, cell: Cell) -> List[Cell]:
+        """ Follows the next steps towards a source of the cluster from cell, returns the cells after cell up to the source. """
+        x_min, y_min, _, _ = self.cluster_bounds(cluster)
+        cells = []
+        x, y = cell
+        direction = next_steps[x - x_min][y - y_min]
+        while direction >= 0:
+            dx, dy = DIRECTIONS[direction]
+            x, y = x + dx, y + dy
+            cells.append((x, y))
+            direction = next_steps[x - x_min][y - y_min]
+        return cells
+
+    def _smooth(self, start: Cell, segments: Iterator[Tuple[List[Cell], bool]]) -> Iterator[Cell]:
+        """
+        Yields the cells of the refined segments, replacing the part of the path around each waypoint with a cheaper straight
+        octile walk when one is free. A border crossing is a single step, its two waypoints are smoothed together once the
+        next segment is known. Only the last cluster_size cells are held back.
+        """
+        radii = sorted({self.cluster_size, max(self.cluster_size // 2, 2), max(self.cluster_size // 4, 2)}, reverse=True)
+        keep = radii[0] + 1
+        pending = [start]
+        crossing = None
+        for segment, is_crossing in segments:
+            junction = len(pending) - 1
+            pending.extend(segment)
+            if is_crossing:
+                crossing = junction
+                continue
+            if crossing is not None:
+                junction, crossing = crossing, None
+            if junction > 0:
+                self._shortcut_at(pending, junction, radii)
+            if len(pending) > keep + 1:
+                emit = len(pending) - keep - 1
+                yield from pending[1:emit + 1]
+                del pending[:emit]
+        if crossing is not None and crossing > 0:
+            self._shortcut_at(pending, crossing, radii)
+        yield from pending[1:]
+
+    def _shortcut_at(self, path: List[Cell], junction: int, radii: List[int]):
+        for radius in radii:
+            low, high = max(0, junction - radius), min(len(path) - 1, junction + radius)
+            if high - low < 2:
+                continue
+            a, b = path[low], path[high]
+            cost = self._walk_cost(path, low, high)
+            if cost - self._octile(a, b) < 1e-9:
+                continue
+            walk = self._straight_walk(a, b)
+            if walk is not None and self._walk_cost([a] + walk, 0, len(walk)) < cost - 1e-9:
+                path[low + 1:high + 1] = walk
+                return
+
+    def _walk_cost(self, cells: List[Cell], low: int, high: int) -> float:
+        """ The cost of the steps of cells from index low to index high. """
+        diagonals = 0
+        x, y = cells[low]
+        for index in range(low + 1, high + 1):
+            nx, ny = cells[index]
+            if x != nx and y != ny:
+                diagonals += 1
+            x, y = nx, ny
+        return (high - low - diagonals) + diagonals * self.diagonal_cost
+
+    def _straight_walk(self, a: Cell, b: Cell) -> Optional[List[Cell]]:
+        """
+        A free walk from a to b made of the diagonal steps then the straight steps of the octile distance, or the straight
+        steps first, the cells after a up to b included, or None if both are blocked.
+        """
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        sx, sy = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+        diagonal = min(abs(dx), abs(dy))
+        straight = (sx, 0) if abs(dx) > abs(dy) else (0, sy)
+        steps = [(sx, sy)] * diagonal + [straight] * (max(abs(dx), abs(dy)) - diagonal)
+        # a and b are free and the walk stays in their bounding box, so it never leaves the map
+        blocked, height = self._blocked, self.height
+        for order in (steps, steps[::-1]):
+            x, y = a
+            cells = []
+            for step_x, step_y in order:
+                nx, ny = x + step_x, y + step_y
+                if blocked[nx * height + ny] or (step_x and step_y and (blocked[nx * height + y] or blocked[x * height + ny])):
+                    break
+                x, y = nx, ny
+                cells.append((x, y))
+            else:
+                return cells
+        return None
+
+    def find_path(self, start: Tuple[int, int, int], goal: Tuple[int, int, int]) -> Optional[List[Tuple[int, int, int]]]:
+        """
+        Finds a path between two positions of the z level, fully refined and smoothed.
+
+        :param start: The starting position.
+        :param goal: The goal position.
+        :return: The positions from the one after start to goal included, an empty list if start is goal, None if there is no path.
+        """
+        path = self.iter_path(start, goal)
+        return list(path) if path is not None else None
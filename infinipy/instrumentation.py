@@ -0,0 +1,196 @@
+from typing import Optional, Dict, List, Callable, Any, Tuple
+from collections import defaultdict
+from contextvars import ContextVar
+import functools
+import json
+import threading
+import time
+from infinipy.worldstatement import WorldStatement, InternedWorldStatement
+
+# SearchStats measuring the WorldStatement operations in the current context, None while a timed operation is running
+# so that operations calling each other, e.g. an override calling super(), are only measured once
+_timing_stats: ContextVar[Optional['SearchStats']] = ContextVar("timing_stats", default=None)
+_timing_lock = threading.Lock()
+# number of SearchStats currently timing, in any context, and the operations replaced while it is positive
+_timing_count = 0
+_timing_originals: List[Tuple[type, str, Callable]] = []
+
+
+def _timed(name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        stats = _timing_stats.get()
+        if stats is None:
+            return method(*args, **kwargs)
+        token = _timing_stats.set(None)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.operation_time[name] += time.perf_counter() - start
+            stats.operation_calls[name] += 1
+            _timing_stats.reset(token)
+    return timed
+
+
+def _acquire_timing():
+    """ Wraps the timed WorldStatement operations when the first SearchStats starts timing. """
+    global _timing_count
+    with _timing_lock:
+        if _timing_count == 0:
+            for cls in (WorldStatement, InternedWorldStatement):
+                for name in SearchStats.TIMED_OPERATIONS:
+                    if name in cls.__dict__:
+                        _timing_originals.append((cls, name, cls.__dict__[name]))
+                        setattr(cls, name, _timed(name, cls.__dict__[name]))
+        _timing_count += 1
+
+
+def _release_timing():
+    """ Restores the original WorldStatement operations when the last SearchStats stops timing. """
+    global _timing_count
+    with _timing_lock:
+        _timing_count -= 1
+        if _timing_count == 0:
+            for cls, name, method in reversed(_timing_originals):
+                setattr(cls, name, method)
+            _timing_originals.clear()
+
+
+class SearchStats:
+    # WorldStatement operations that can be timed, wrapped on the classes only while a SearchStats is timing
+    TIMED_OPERATIONS = ("falsifies", "validates", "merge", "force_merge", "remove_intersection")
+
+    def __init__(self, on_expand: Optional[Callable[['SearchStats', Any, float, int], None]] = None,
+                 record_tree: bool = False, time_operations: bool = False):
+        """
+        Collects counters, timings and optionally the search tree of the GOAP planners and Options.
+        The planners only touch it when it is attached with GOAP.instrumented, a GOAP without SearchStats pays nothing.
+
+        :param on_expand: Optional callback called for every expanded node with (stats, node, cost, frontier size).
+        :param record_tree: If True, every generated edge is recorded so that the search tree can be exported.
+        :param time_operations: If True, the time spent in falsifies, validates and the merge operations is measured.
+        """
+        self.on_expand = on_expand
+        self.record_tree = record_tree
+        self.time_operations = time_operations
+        self._timing_tokens = []
+        self.reset()
+
+    def reset(self):
+        """ Resets every counter and the recorded tree. """
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.peak_frontier = 0
+        self.solutions = 0
+        self.operation_calls: Dict[str, int] = defaultdict(int)
+        self.operation_time: Dict[str, float] = defaultdict(float)
+        self.search_time = 0.0
+        self._node_ids: Dict[Any, int] = {}
+        self._node_labels: List[str] = []
+        self._edges: List[Tuple[int, int, str, float]] = []
+        self._expanded_ids: List[int] = []
+
+    @property
+    def branching_factor(self) -> float:
+        """ Average number of successors generated per expanded node. """
+        return self.generated / self.expanded if self.expanded else 0.0
+
+    def node_id(self, node: Any) -> int:
+        """ Returns a stable integer id for a node (a world or an Option) of the recorded tree. """
+        node_id = self._node_ids.get(node)
+        if node_id is None:
+            node_id = len(self._node_labels)
+            self._node_ids[node] = node_id
+            self._node_labels.append(self._label(node))
+        return node_id
+
+    @staticmethod
+    def _label(node: Any) -> str:
+        world = getattr(node, "global_prerequisites", node)
+        conditions = getattr(world, "conditions", None)
+        if conditions is None:
+            return str(node)
+        return "; ".join(f"{key}: {value.name}" for key, value in conditions.items())
+
+    def expand(self, node: Any, cost: float, frontier_size: int):
+        """ Records the expansion of a node. """
+        self.expanded += 1
+        if frontier_size > self.peak_frontier:
+            self.peak_frontier = frontier_size
+        if self.record_tree:
+            self._expanded_ids.append(self.node_id(node))
+        if self.on_expand is not None:
+            self.on_expand(self, node, cost, frontier_size)
+
+    def generate(self, parent: Any, child: Any, action_name: str, cost: float, duplicate: bool = False):
+        """ Records the generation of a successor, duplicate is True when the child was already reached at a lower or equal cost. """
+        self.generated += 1
+        if duplicate:
+            self.duplicates += 1
+        if self.record_tree:
+            self._edges.append((self.node_id(parent), self.node_id(child), action_name, cost))
+
+    def start_timing(self):
+        """
+        Starts measuring the timed WorldStatement operations called in the current context, i.e. by the current thread
+        or asyncio task. The operations are wrapped on the classes while at least one SearchStats is timing and restored
+        afterwards, so they cost nothing when timing is off. Calls to start_timing and stop_timing must be paired, and can
+        be nested with other SearchStats, the innermost one is measuring.
+        """
+        _acquire_timing()
+        self._timing_tokens.append(_timing_stats.set(self))
+
+    def stop_timing(self):
+        """ Stops the measurement started by the matching start_timing. """
+        if self._timing_tokens:
+            _timing_stats.reset(self._timing_tokens.pop())
+            _release_timing()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Returns the counters and timings as a dictionary. """
+        return {
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "branching_factor": self.branching_factor,
+            "peak_frontier": self.peak_frontier,
+            "solutions": self.solutions,
+            "search_time": self.search_time,
+            "operation_calls": dict(self.operation_calls),
+            "operation_time": dict(self.operation_time),
+        }
+
+    def export_json(self, path: str):
+        """
+        Writes the counters and the recorded search tree to a JSON file.
+
+        :param path: Path of the output file.
+        """
+        data = self.as_dict()
+        data["nodes"] = [{"id": node_id, "label": label} for node_id, label in enumerate(self._node_labels)]
+        data["edges"] = [{"source": source, "target": target, "action": action, "cost": cost} for source, target, action, cost in self._edges]
+        data["expansion_order"] = self._expanded_ids
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+
+    def export_dot(self, path: str):
+        """
+        Writes the recorded search tree to a Graphviz DOT file, expanded nodes are drawn filled.
+
+        :param path: Path of the output file.
+        """
+        expanded = set(self._expanded_ids)
+        lines = ["digraph search {"]
+        for node_id, label in enumerate(self._node_labels):
+            style = ', style=filled' if node_id in expanded else ''
+            lines.append(f'  n{node_id} [label={json.dumps(label)}{style}];')
+        for source, target, action, cost in self._edges:
+            lines.append(f'  n{source} -> n{target} [label={json.dumps(f"{action} ({cost})")}];')
+        lines.append("}")
+        with open(path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+
+    def __repr__(self):
+        return f"SearchStats(expanded={self.expanded}, generated={self.generated}, duplicates={self.duplicates}, peak_frontier={self.peak_frontier})"
@@ -0,0 +1,240 @@
+from typing import Dict, List, Tuple, Optional, Set, TYPE_CHECKING
+import heapq
+import math
+if TYPE_CHECKING:
+    from infinipy.gridmap import GridMap
+
+# the eight directions as (dx, dy)
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+class JumpPointSearch:
+    def __init__(self, grid_map: 'GridMap', z: int = 0):
+        """
+        Jump Point Search over the blocks_move grid of one z level of a GridMap, for 8-connected moves without corner cutting.
+
+        Straight jumps are answered from precomputed tables in the spirit of JPS+: for every cell and each of the four straight
+        directions the table holds the next jump point and the last free cell before a wall. Diagonal jumps walk the diagonal
+        and query the straight tables at each step. The tables of a row only depend on the row and its two neighbouring rows,
+        and similarly for columns, so a blocker change only invalidates rows y-1..y+1 and columns x-1..x+1, rebuilt lazily.
+
+        :param grid_map: The GridMap providing blocks_move_grid, changes are received through its blocks listeners.
+        :param z: The z level searched.
+        """
+        self.grid_map = grid_map
+        self.z = z
+        self.width, self.height = grid_map.map_size
+        # per row y, for each x: x of the next jump point moving east/west or -1, and x of the last free cell before a wall
+        self._east: List[Optional[Tuple[List[int], List[int]]]] = [None] * self.height
+        self._west: List[Optional[Tuple[List[int], List[int]]]] = [None] * self.height
+        # per column x, for each y: same for moving south (+y) and north (-y)
+        self._south: List[Optional[Tuple[List[int], List[int]]]] = [None] * self.width
+        self._north: List[Optional[Tuple[List[int], List[int]]]] = [None] * self.width
+        self._dirty_rows: Set[int] = set(range(self.height))
+        self._dirty_columns: Set[int] = set(range(self.width))
+        self._blocked = None
+        self.rebuilt_rows = 0
+        self.rebuilt_columns = 0
+        grid_map.add_blocks_listener(self._on_blocks_changed)
+
+    def _on_blocks_changed(self, kind: str, position: Optional[Tuple[int, int, int]]):
+        if kind != "move":
+            return
+        self._blocked = None
+        if position is None:
+            self._dirty_rows.update(range(self.height))
+            self._dirty_columns.update(range(self.width))
+            return
+        x, y, z = position
+        if z != self.z:
+            return
+        self._dirty_rows.update(row for row in (y - 1, y, y + 1) if 0 <= row < self.height)
+        self._dirty_columns.update(column for column in (x - 1, x, x + 1) if 0 <= column < self.width)
+
+    def free(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height and not self._blocked[x * self.height + y]
+
+    def _refresh(self):
+        """ Takes a snapshot of the blockers and rebuilds the invalidated rows and columns. """
+        if self._blocked is None:
+            self._blocked = self.grid_map.blocks_move_grid[:, :, self.z].tobytes()
+        for y in self._dirty_rows:
+            self._east[y] = self._build_line(y, 1, True)
+            self._west[y] = self._build_line(y, -1, True)
+        for x in self._dirty_columns:
+            self._south[x] = self._build_line(x, 1, False)
+            self._north[x] = self._build_line(x, -1, False)
+        self.rebuilt_rows += len(self._dirty_rows)
+        self.rebuilt_columns += len(self._dirty_columns)
+        self._dirty_rows.clear()
+        self._dirty_columns.clear()
+
+    def _build_line(self, line: int, step: int, horizontal: bool) -> Tuple[List[int], List[int]]:
+        """
+        Builds the jump table of one row (horizontal) or column for one direction.
+        A cell entered along the line is a jump point when it has a forced neighbour, i.e. a free side cell whose
+        side cell one step behind is blocked.
+        """
+        free = self.free
+        length = self.width if horizontal else self.height
+        jump = [-1] * length
+        last = list(range(length))
+        if horizontal:
+            def forced(i: int) -> bool:
+                y = line
+                return (free(i, y - 1) and not free(i - step, y - 1)) or (free(i, y + 1) and not free(i - step, y + 1))
+
+            def is_free(i: int) -> bool:
+                return free(i, line)
+        else:
+            def forced(i: int) -> bool:
+                x = line
+                return (free(x - 1, i) and not free(x - 1, i - step)) or (free(x + 1, i) and not free(x + 1, i - step))
+
+            def is_free(i: int) -> bool:
+                return free(line, i)
+        order = range(length - 1, -1, -1) if step > 0 else range(length)
+        for i in order:
+            following = i + step
+            if not (0 <= following < length) or not is_free(following):
+                continue
+            last[i] = last[following]
+            jump[i] = following if forced(following) else jump[following]
+        return jump, last
+
+    def _jump_straight(self, x: int, y: int, dx: int, dy: int, goal: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """ Jumps from (x, y) in a straight direction, returns the jump point reached or None. """
+        if dx:
+            jump, last = (self._east if dx > 0 else self._west)[y]
+            target = jump[x]
+            if goal[1] == y:
+                end = target if target >= 0 else last[x]
+                if (x < goal[0] <= end) if dx > 0 else (end <= goal[0] < x):
+                    return goal
+            return (target, y) if target >= 0 else None
+        jump, last = (self._south if dy > 0 else self._north)[x]
+        target = jump[y]
+        if goal[0] == x:
+            end = target if target >= 0 else last[y]
+            if (y < goal[1] <= end) if dy > 0 else (end <= goal[1] < y):
+                return goal
+        return (x, target) if target >= 0 else None
+
+    def _jump_diagonal(self, x: int, y: int, dx: int, dy: int, goal: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """ Walks the diagonal from (x, y) until a cell with a straight jump point, the goal, or a blocked step. """
+        free = self.free
+        while free(x + dx, y) and free(x, y + dy) and free(x + dx, y + dy):
+            x += dx
+            y += dy
+            if (x, y) == goal:
+                return goal
+            if self._jump_straight(x, y, dx, 0, goal) is not None or self._jump_straight(x, y, 0, dy, goal) is not None:
+                return x, y
+        return None
+
+    def _directions(self, x: int, y: int, parent: Optional[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """ The pruned directions to explore from (x, y) when reached from parent. """
+        free = self.free
+        if parent is None:
+            return [(dx, dy) for dx, dy in DIRECTIONS
+                    if free(x + dx, y + dy) and (not (dx and dy) or (free(x + dx, y) and free(x, y + dy)))]
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        directions = []
+        if dx and dy:
+            if free(x, y + dy):
+                directions.append((0, dy))
+            if free(x + dx, y):
+                directions.append((dx, 0))
+            if free(x, y + dy) and free(x + dx, y):
+                directions.append((dx, dy))
+        elif dx:
+            up, down = free(x, y - 1), free(x, y + 1)
+            if free(x + dx, y):
+                directions.append((dx, 0))
+                if up and not free(x - dx, y - 1) and free(x + dx, y - 1):
+                    directions.append((dx, -1))
+                if down and not free(x - dx, y + 1) and free(x + dx, y + 1):
+                    directions.append((dx, 1))
+            if up:
+                directions.append((0, -1))
+            if down:
+                directions.append((0, 1))
+        else:
+            left, right = free(x - 1, y), free(x + 1, y)
+            if free(x, y + dy):
+                directions.append((0, dy))
+                if left and not free(x - 1, y - dy) and free(x - 1, y + dy):
+                    directions.append((-1, dy))
+                if right and not free(x + 1, y - dy) and free(x + 1, y + dy):
+                    directions.append((1, dy))
+            if left:
+                directions.append((-1, 0))
+            if right:
+                directions.append((1, 0))
+        return directions
+
+    @staticmethod
+    def octile(a: Tuple[int, int], b: Tuple[int, int], diagonal_cost: float = math.sqrt(2)) -> float:
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return dx + dy + (min(diagonal_cost, 2.0) - 2) * min(dx, dy)
+
+    def find_path(self, start: Tuple[int, int, int], goal: Tuple[int, int, int], diagonal_cost: float = math.sqrt(2)) -> Optional[List[Tuple[int, int, int]]]:
+        """
+        Finds a shortest path between two positions of the z level.
+
+        :param start: The starting position.
+        :param goal: The goal position.
+        :param diagonal_cost: The cost of a diagonal step, straight steps cost 1.
+        :return: The positions from the one after start to goal included, an empty list if start is goal, None if there is no path.
+        """
+        if start == goal:
+            return []
+        self._refresh()
+        start_xy, goal_xy = (start[0], start[1]), (goal[0], goal[1])
+        if start[2] != self.z or goal[2] != self.z or not self.free(*goal_xy):
+            return None
+        start_h = self.octile(start_xy, goal_xy, diagonal_cost)
+        open_set = [(start_h, start_h, start_xy)]
+        g_score: Dict[Tuple[int, int], float] = {start_xy: 0.0}
+        came_from: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {start_xy: None}
+        closed = set()
+
+        while open_set:
+            _, _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            if current == goal_xy:
+                return self._expand_path(came_from, current)
+            closed.add(current)
+            x, y = current
+            for dx, dy in self._directions(x, y, came_from[current]):
+                if dx and dy:
+                    jump_point = self._jump_diagonal(x, y, dx, dy, goal_xy)
+                else:
+                    jump_point = self._jump_straight(x, y, dx, dy, goal_xy)
+                if jump_point is None or jump_point in closed:
+                    continue
+                tentative_g_score = g_score[current] + self.octile(current, jump_point, diagonal_cost)
+                if tentative_g_score < g_score.get(jump_point, float('inf')):
+                    g_score[jump_point] = tentative_g_score
+                    came_from[jump_point] = current
+                    h = self.octile(jump_point, goal_xy, diagonal_cost)
+                    heapq.heappush(open_set, (tentative_g_score + h, h, jump_point))
+        return None
+
+    def _expand_path(self, came_from: Dict[Tuple[int, int], Optional[Tuple[int, int]]], end: Tuple[int, int]) -> List[Tuple[int, int, int]]:
+        """ Interpolates the jump points into consecutive positions, jumps are straight or diagonal lines. """
+        jump_points = []
+        node = end
+        while node is not None:
+            jump_points.append(node)
+            node = came_from[node]
+        jump_points.reverse()
+        path = []
+        for (x0, y0), (x1, y1) in zip(jump_points, jump_points[1:]):
+            dx = (x1 > x0) - (x1 < x0)
+            dy = (y1 > y0) - (y1 < y0)
+            for step in range(1, max(abs(x1 - x0), abs(y1 - y0)) + 1):
+                path.append((x0 + step * dx, y0 + step * dy, self.z))
+        return path
@@ -1,9 +1,17 @@
 from infinipy.actions import Action
 from collections import defaultdict
-from typing import Tuple, Optional
+import logging
+from typing import Tuple, Optional, List
 from infinipy.statement import CompositeStatement
 from infinipy.worldstatement import WorldStatement
 
+logger = logging.getLogger(__name__)
+
+
+def _format_conditions(world: WorldStatement) -> str:
+    return "; ".join(f"{key}: {value.name}" for key, value in world.conditions.items())
+
+
 class Option:
     def __init__(self, starting_consequences: Optional[WorldStatement] = None,starting_prerequisites:  Optional[WorldStatement] = None, clamp_starting_consequences: bool = False):
         """
@@ -12,6 +20,8 @@ class Option:
         This implies that actions that are appended to the sequence must have prerequisites that are not falsified by the starting_world.
         If ending_world is not None, it is used as the starting point for the global consequences and only actions that lead to compatible consequences can be appended.
         These are managed as WorldStatements which contain dictionaries indexed by (source_id, target_id) tuples. and Tuples with Comp
+        The action sequence is kept as two persistent linked lists, prepended actions in front and appended actions in back,
+        so that appended and prepended snapshots share their actions and WorldStatements with the parent Option.
         """
         self.actions = []
         self.clamp_starting_consequences = clamp_starting_consequences
@@ -21,6 +31,75 @@ class Option:
         self.global_prerequisites = starting_prerequisites if starting_prerequisites is not None else WorldStatement([])
         
 
+    @property
+    def actions(self) -> List[Action]:
+        """
+        The sequence of actions of the Option, materialized from the persistent front and back lists.
+        A new list is returned on every access, modifying it does not change the Option, use append and prepend.
+        """
+        if self._actions is None:
+            front = []
+            node = self._front
+            while node is not None:
+                action, node = node
+                front.append(action)
+            back = []
+            node = self._back
+            while node is not None:
+                node, action = node
+                back.append(action)
+            back.reverse()
+            self._actions = tuple(front + back)
+        return list(self._actions)
+
+    @actions.setter
+    def actions(self, actions: List[Action]):
+        self._front = None
+        self._back = None
+        for action in actions:
+            self._back = (self._back, action)
+        self._actions = None
+
+    def _snapshot(self) -> 'Option':
+        """
+        Returns a new Option sharing the action lists and the WorldStatements of this one.
+        WorldStatements are never modified in place, so sharing them is safe.
+        """
+        snapshot = Option.__new__(Option)
+        snapshot.clamp_starting_consequences = self.clamp_starting_consequences
+        snapshot.global_consequences = self.global_consequences
+        snapshot.global_prerequisites = self.global_prerequisites
+        snapshot._front = self._front
+        snapshot._back = self._back
+        snapshot._actions = None
+        return snapshot
+
+    def appended(self, action: Action, allows_extra_pre: bool = False) -> Optional['Option']:
+        """
+        Persistent version of append, the current Option is left untouched.
+
+        :param action: The action to be appended.
+        :return: A new Option ending with the action, or None if the action cannot be appended.
+        """
+        snapshot = self._snapshot()
+        if snapshot.update_forward(action, allows_extra_pre):
+            snapshot._back = (self._back, action)
+            return snapshot
+        return None
+
+    def prepended(self, action: Action, must_satisfy_pre: bool = False) -> Optional['Option']:
+        """
+        Persistent version of prepend, the current Option is left untouched.
+
+        :param action: The action to be prepended.
+        :return: A new Option starting with the action, or None if the action cannot be prepended.
+        """
+        snapshot = self._snapshot()
+        if snapshot.update_backward(action, must_satisfy_pre):
+            snapshot._front = (action, self._front)
+            return snapshot
+        return None
+
     def print_conditions(self):
         """
         Prints nicely formatted conditions using f-strings
@@ -38,7 +117,8 @@ class Option:
         """
         
         if self.update_forward(action,allows_extra_pre):
-            self.actions.append(action)
+            self._back = (self._back, action)
+            self._actions = None
             return True
         return False
 
@@ -49,7 +129,8 @@ class Option:
         :param action: The action to be prepended.
         """
         if self.update_backward(action,must_satisfy_pre):
-            self.actions.insert(0, action)
+            self._front = (action, self._front)
+            self._actions = None
             return True
         return False
 
@@ -60,14 +141,14 @@ class Option:
         :param action: The action to process.
         """
         
-        #extract the action pre and consequence and convert to WorldStatement
-        action_pre = WorldStatement.from_dict(action.pre_dict)
-        action_con = WorldStatement.from_dict(action.con_dict)
+        #use the action pre and consequence compiled as WorldStatements
+        action_pre = action.pre_world
+        action_con = action.con_world
         #first we check that the action does not have conflicting prerequisite with the current consquences
         # that is that the consequense not falsify the prereq
         #in that case it is not possible to append the action
         if self.global_consequences.falsifies(action_pre):
-            print(f"The action {action.name} cannot be appended because the global consequences falsify the action prereq")
+            logger.debug("The action %s cannot be appended because the global consequences falsify the action prereq", action.name)
             return False
         #now we check if the action adds additional prereq that are not already in the global prereq
         # and if allows_extra_pre is False we return False
@@ -75,9 +156,9 @@ class Option:
             #some of the prereq are not satisfied by the global consequences
             unsatisfied_pre = action_pre.remove_intersection(self.global_consequences)
             if not allows_extra_pre:
-                print(f"The action {action.name} cannot be apppended because it adds additional prereq that are not satisfied by the global consequences and allows_extra_pre is False")
-                print("Unsatisfied prereq:")
-                unsatisfied_pre.print_conditions()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("The action %s cannot be apppended because it adds additional prereq that are not satisfied by the global consequences and allows_extra_pre is False. Unsatisfied prereq: %s",
+                                 action.name, _format_conditions(unsatisfied_pre))
                 return False
 
             #we update the global prereq with the unsatisfied prereq
@@ -95,9 +176,9 @@ class Option:
 
         :param action: The action to process.
         """
-        #extract the action pre and consequence and convert to WorldStatement
-        action_pre = WorldStatement.from_dict(action.pre_dict)
-        action_con = WorldStatement.from_dict(action.con_dict)
+        #use the action pre and consequence compiled as WorldStatements
+        action_pre = action.pre_world
+        action_con = action.con_world
 
         #case 1 the action consequences are not conflicting with the current state of the world
         # the current state of the world is the global_prerequisite if actions are already present
@@ -106,7 +187,7 @@ class Option:
         global_pre = self.global_prerequisites
 
         if action_con.falsifies(global_pre):
-            print(f"The action {action.name} cannot be prepended because the action consequences falsify the global prereq")
+            logger.debug("The action %s cannot be prepended because the action consequences falsify the global prereq", action.name)
             return False
         
         
@@ -117,9 +198,9 @@ class Option:
             #some of the prereq are not satisfied by the global consequences
             unsatisfied_pre = global_pre.remove_intersection(action_con)
             if must_satisfy_pre:
-                print(f"The action {action.name} cannot be prepended because the action consequences do not fully satisfy the global prereq and must_satisfy_pre is True")
-                print("Unsatisfied prereq:")
-                unsatisfied_pre.print_conditions()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("The action %s cannot be prepended because the action consequences do not fully satisfy the global prereq and must_satisfy_pre is True. Unsatisfied prereq: %s",
+                                 action.name, _format_conditions(unsatisfied_pre))
                 return False
 
             #we update the global pre by removing the prereq already satisfied by the action consequences
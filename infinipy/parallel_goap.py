@@ -0,0 +1,130 @@
+from typing import List, Tuple, Optional, Dict, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+import heapq
+import itertools
+from infinipy.statement import CompiledCompositeStatement
+from infinipy.worldstatement import WorldStatement, InternedWorldStatement
+from infinipy.actions import Action
+
+# (name, cost, pre_mask, pre_values, con_mask, con_values)
+EncodedAction = Tuple[str, float, int, int, int, int]
+# (start_mask, start_values, goal_mask, goal_values, actions)
+EncodedProblem = Tuple[int, int, int, int, Tuple[EncodedAction, ...]]
+
+
+def encode_problem(start_state: WorldStatement, goal_state: WorldStatement, actions: List[Action]) -> EncodedProblem:
+    """
+    Encodes a planning problem into plain integers and strings so that it can be pickled and sent to another process.
+    Every (source_id, target_id, statement) fact of the problem gets a local bit, worlds and actions become pairs of bitmasks
+    (facts mentioned, truth values), no Statement or callable is part of the encoding.
+
+    :param start_state: Starting WorldStatement.
+    :param goal_state: Goal WorldStatement to achieve.
+    :param actions: List of actions available to the agent.
+    :return: The encoded problem.
+    """
+    fact_bits: Dict[Tuple[Tuple[Optional[str], Optional[str]], int], int] = {}
+
+    def encode(world: WorldStatement) -> Tuple[int, int]:
+        mask = 0
+        values = 0
+        for key, composite in InternedWorldStatement.intern(world).conditions.items():
+            for index in CompiledCompositeStatement.iter_bits(composite.mask):
+                bit = 1 << fact_bits.setdefault((key, index), len(fact_bits))
+                mask |= bit
+                if composite.values >> index & 1:
+                    values |= bit
+        return mask, values
+
+    start_mask, start_values = encode(start_state)
+    goal_mask, goal_values = encode(goal_state)
+    encoded_actions = tuple((action.name, action.cost) + encode(action.pre_world) + encode(action.con_world) for action in actions)
+    return start_mask, start_values, goal_mask, goal_values, encoded_actions
+
+
+def solve_encoded(problem: EncodedProblem, max_nodes: Optional[int] = None) -> Optional[List[str]]:
+    """
+    A* search over an encoded problem, with the same semantics as GOAP.astar_solve.
+    An action applies when the world validates its prerequisites and its consequences overwrite the world facts.
+
+    :param problem: The problem produced by encode_problem.
+    :param max_nodes: Maximum number of node expansions before giving up, None for no limit.
+    :return: The names of the actions of the cheapest plan, or None if no plan was found.
+    """
+    start_mask, start_values, goal_mask, goal_values, actions = problem
+
+    def unsatisfied(mask: int, values: int) -> int:
+        return (goal_mask & ~(mask & ~(values ^ goal_values))).bit_count()
+
+    k = max([(con_mask & goal_mask & ~(con_values ^ goal_values)).bit_count() for _, _, _, _, con_mask, con_values in actions], default=0)
+    k = max(k, 1)
+    min_cost = min([cost for _, cost, _, _, _, _ in actions], default=0.0)
+
+    def heuristic(mask: int, values: int) -> float:
+        return -(-unsatisfied(mask, values) // k) * min_cost
+
+    start = (start_mask, start_values)
+    tie = itertools.count()
+    start_h = heuristic(*start)
+    open_set = [(start_h, start_h, next(tie), start)]
+    g_score = {start: 0.0}
+    came_from = {start: (None, None)}
+    closed = set()
+    expanded = 0
+
+    while open_set:
+        _, _, _, world = heapq.heappop(open_set)
+        if world in closed:
+            continue
+        mask, values = world
+        if unsatisfied(mask, values) == 0:
+            path = []
+            parent, name = came_from[world]
+            while parent is not None:
+                path.append(name)
+                parent, name = came_from[parent]
+            path.reverse()
+            return path
+        if max_nodes is not None and expanded >= max_nodes:
+            return None
+        closed.add(world)
+        expanded += 1
+
+        for name, cost, pre_mask, pre_values, con_mask, con_values in actions:
+            if pre_mask & ~mask or (values ^ pre_values) & pre_mask:
+                continue
+            new_world = (mask | con_mask, (values & ~con_mask) | con_values)
+            tentative_g_score = g_score[world] + cost
+            if tentative_g_score < g_score.get(new_world, float('inf')):
+                g_score[new_world] = tentative_g_score
+                came_from[new_world] = (world, name)
+                closed.discard(new_world)
+                h = heuristic(*new_world)
+                heapq.heappush(open_set, (tentative_g_score + h, h, next(tie), new_world))
+
+    return None
+
+
+def plan_batch(problems: Sequence[Tuple[WorldStatement, WorldStatement, List[Action]]],
+               max_workers: Optional[int] = None,
+               max_nodes: Optional[int] = None,
+               executor: Optional[Executor] = None,
+               chunksize: int = 1) -> List[Optional[List[str]]]:
+    """
+    Solves many (start, goal, actions) problems in parallel on a process pool.
+    The problems are encoded in the calling process with encode_problem, so Statement callables never need to be pickled.
+
+    :param problems: Sequence of (start WorldStatement, goal WorldStatement, list of actions) tuples.
+    :param max_workers: Number of worker processes when no executor is given, None for the number of CPUs.
+    :param max_nodes: Maximum number of node expansions per problem, None for no limit.
+    :param executor: Optional executor to reuse across calls, e.g. one pool kept alive for every game tick.
+    :param chunksize: Number of problems sent to a worker at once.
+    :return: For each problem, in order, the action names of the plan or None if no plan was found.
+    """
+    encoded = [encode_problem(start_state, goal_state, actions) for start_state, goal_state, actions in problems]
+    solve = partial(solve_encoded, max_nodes=max_nodes)
+    if executor is not None:
+        return list(executor.map(solve, encoded, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(solve, encoded, chunksize=chunksize))
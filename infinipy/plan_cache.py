@@ -0,0 +1,114 @@
+from typing import Tuple, Optional, Dict, FrozenSet
+from infinipy.options import Option
+from infinipy.worldstatement import WorldStatement, InternedWorldStatement
+from infinipy.goap import GOAP
+from infinipy.utils import LRUCache
+
+_MISSING = object()
+
+
+class PlanCache:
+    def __init__(self, goap: GOAP, maxsize: Optional[int] = 1024, solver: str = "astar_solve"):
+        """
+        Caches the plans of a GOAP solver keyed on canonical fingerprints of the start and goal WorldStatements.
+
+        Only the part of the start world that can influence a plan is fingerprinted, i.e. the facts whose statements
+        are mentioned by the prerequisites of some action or by the goal. The cache is cleared whenever the actions of the
+        GOAP solver change.
+
+        :param goap: The GOAP solver whose plans are cached.
+        :param maxsize: Maximum number of cached plans, least recently used plans are evicted first.
+        :param solver: Name of the GOAP method used on a miss, e.g. "astar_solve" or "bidirectional_solve".
+        """
+        self.goap = goap
+        self.solver = solver
+        self.cache = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._actions_signature = None
+        self._relevant_masks: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+
+    def _check_actions(self):
+        """ Clears the cache and recomputes the relevant facts if the action set of the solver changed. """
+        signature = tuple(id(action) for action in self.goap.actions)
+        if signature == self._actions_signature:
+            return
+        if self._actions_signature is not None:
+            self.invalidations += 1
+        self.cache.clear()
+        self._actions_signature = signature
+        relevant_masks = {}
+        for action in self.goap.actions:
+            for key, composite in action.pre_world.conditions.items():
+                relevant_masks[key] = relevant_masks.get(key, 0) | composite.mask
+        self._relevant_masks = relevant_masks
+
+    def fingerprint(self, start_state: WorldStatement, goal_state: WorldStatement) -> Tuple[FrozenSet, FrozenSet]:
+        """
+        Computes the canonical, order independent fingerprint of a (start, goal) query.
+
+        :param start_state: Starting WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        :return: A hashable fingerprint.
+        """
+        self._check_actions()
+        start = InternedWorldStatement.intern(start_state)
+        goal = InternedWorldStatement.intern(goal_state)
+        relevant_start = []
+        for key, composite in start.conditions.items():
+            relevant = composite.mask & (self._relevant_masks.get(key, 0) | (goal.conditions[key].mask if key in goal.conditions else 0))
+            if relevant:
+                relevant_start.append((key, relevant, composite.values & relevant))
+        return frozenset(relevant_start), goal.fingerprint
+
+    def solve(self, start_state: WorldStatement, goal_state: WorldStatement, **solver_kwargs) -> Optional[Option]:
+        """
+        Returns the plan from start_state to goal_state, running the solver only on a cache miss.
+        Cached action sequences are replayed on a new Option starting from start_state, so the returned Option
+        always describes the actual start world. Failures are cached only when no search budget is given.
+
+        :param start_state: Starting WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        :param solver_kwargs: Extra keyword arguments forwarded to the solver, e.g. max_nodes.
+        :return: An Option with the plan, or None if no plan was found.
+        """
+        key = self.fingerprint(start_state, goal_state)
+        actions = self.cache.get(key, _MISSING)
+        if actions is not _MISSING:
+            self.hits += 1
+            if actions is None:
+                return None
+            option = Option(starting_consequences=start_state)
+            for action in actions:
+                option.append(action)
+            return option
+        self.misses += 1
+        option = getattr(self.goap, self.solver)(start_state, goal_state, **solver_kwargs)
+        if option is not None:
+            self.cache.put(key, tuple(option.actions))
+        elif not solver_kwargs.get("max_nodes") and not solver_kwargs.get("max_time"):
+            self.cache.put(key, None)
+        return option
+
+    def clear(self):
+        """ Removes every cached plan and resets the statistics. """
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.cache.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the hit/miss statistics of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.cache),
+            "evictions": self.cache.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,225 @@
+from typing import List, Optional, Dict, Tuple
+from collections import defaultdict
+import heapq
+import itertools
+import time
+from infinipy.options import Option
+from infinipy.worldstatement import WorldStatement, InternedWorldStatement
+from infinipy.goap import GOAP, ActionIndex
+from infinipy.statement import CompiledCompositeStatement
+
+
+class IncrementalGOAP:
+    def __init__(self, goap: GOAP, start_state: WorldStatement, goal_state: WorldStatement):
+        """
+        Anytime planner that keeps its search graph across world changes, in the spirit of D* Lite.
+
+        The search runs backward from the goal with Option.prepended, so the cost-to-goal of every node only depends on the goal
+        and the actions and stays valid when the world changes. A node is a plan candidate as soon as the current world validates
+        its global prerequisites. When the world changes, only the nodes whose prerequisites mention one of the changed facts
+        are checked again and the frontier is reordered with the new heuristic values, then the search continues where it stopped.
+        A best-so-far plan is available at any time through best_plan.
+
+        :param goap: The GOAP solver providing the actions.
+        :param start_state: The current WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        """
+        self.goap = goap
+        self.reset(start_state, goal_state)
+
+    def reset(self, start_state: WorldStatement, goal_state: WorldStatement):
+        """
+        Drops the search graph and starts a new search for a (possibly) new goal.
+
+        :param start_state: The current WorldStatement.
+        :param goal_state: Goal WorldStatement to achieve.
+        """
+        self.start = InternedWorldStatement.intern(start_state)
+        self.goal = InternedWorldStatement.intern(goal_state)
+        self._actions_signature = tuple(id(action) for action in self.goap.actions)
+        action_index = self.goap.action_index
+        k = max([sum(1 for _ in ActionIndex.facts(action_index.con_worlds[action])) for action in self.goap.actions], default=0)
+        self._k = max(k, 1)
+        self._min_cost = min([action.cost for action in self.goap.actions], default=0.0)
+        self._tie = itertools.count()
+        # prerequisites -> (Option, cost to goal)
+        self.nodes: Dict[InternedWorldStatement, Tuple[Option, float]] = {}
+        # (key, statement index) -> prerequisites mentioning that statement
+        self._by_statement: Dict[Tuple[Tuple[Optional[str], Optional[str]], int], List[InternedWorldStatement]] = defaultdict(list)
+        self._open: List[Tuple[float, float, int, InternedWorldStatement, float]] = []
+        self._in_open = set()
+        self._satisfied: Dict[InternedWorldStatement, float] = {}
+        self._leaves = set()
+        # (best executable plan or None, its cost), None when it has to be recomputed
+        self._best: Optional[Tuple[Optional[Option], float]] = None
+        self.expanded = 0
+        self.repaired = 0
+        self._add_node(Option(starting_consequences=self.goal), 0.0)
+
+    def heuristic(self, prerequisites: InternedWorldStatement) -> float:
+        """
+        Lower bound of the cost to reach the prerequisites from the current world:
+        the unsatisfied prerequisite facts, at most k of them satisfied per action of at least the minimum cost.
+        """
+        return -(-self.goap.heuristic(self.start, prerequisites) // self._k) * self._min_cost
+
+    def _push(self, prerequisites: InternedWorldStatement, cost: float):
+        h = self.heuristic(prerequisites)
+        heapq.heappush(self._open, (cost + h, h, next(self._tie), prerequisites, cost))
+        self._in_open.add(prerequisites)
+
+    def _add_node(self, option: Option, cost: float):
+        prerequisites = option.global_prerequisites
+        known = self.nodes.get(prerequisites)
+        if known is not None and known[1] <= cost:
+            return
+        if known is None:
+            for key, composite in prerequisites.conditions.items():
+                for index in CompiledCompositeStatement.iter_bits(composite.mask):
+                    self._by_statement[(key, index)].append(prerequisites)
+        self.nodes[prerequisites] = (option, cost)
+        self._check_node(prerequisites)
+        self._push(prerequisites, cost)
+
+    def _check_node(self, prerequisites: InternedWorldStatement):
+        """Updates the candidate plans with a node according to the current world."""
+        if self.start.validates(prerequisites):
+            cost = self.nodes[prerequisites][1]
+            if self._satisfied.get(prerequisites) != cost:
+                self._satisfied[prerequisites] = cost
+                self._best = None
+        elif self._satisfied.pop(prerequisites, None) is not None:
+            self._best = None
+
+    def update_world(self, delta: WorldStatement) -> InternedWorldStatement:
+        """
+        Applies a change of the world and repairs the search graph.
+        Only the nodes mentioning one of the statements of the delta are checked again, the frontier is reordered with the new
+        heuristic values and expanded candidates that are no longer valid are put back on the frontier.
+        Executing the first action of the plan is also a world change, i.e. update_world(action.con_world).
+
+        :param delta: WorldStatement with the changed conditions, they overwrite the current world.
+        :return: The new current world.
+        """
+        delta = InternedWorldStatement.intern(delta)
+        new_start = self.start.force_merge(delta, force_direction="right")
+        if new_start is self.start:
+            return self.start
+        changed = set()
+        for key, index, _ in ActionIndex.changed_facts(self.start, delta):
+            changed.update(self._by_statement.get((key, index), ()))
+        self.start = new_start
+        self._reindex(changed)
+        return self.start
+
+    def set_world(self, start_state: WorldStatement) -> InternedWorldStatement:
+        """
+        Replaces the current world, repairing every node of the search graph.
+
+        :param start_state: The new current WorldStatement.
+        :return: The new current world.
+        """
+        start = InternedWorldStatement.intern(start_state)
+        if start is not self.start:
+            self.start = start
+            self._reindex(set(self.nodes))
+        return self.start
+
+    def _reindex(self, changed):
+        if tuple(id(action) for action in self.goap.actions) != self._actions_signature:
+            # the cost-to-goal values are not valid for a different action set
+            self.reset(self.start, self.goal)
+            return
+        for prerequisites in changed:
+            self._check_node(prerequisites)
+            if prerequisites in self._leaves and prerequisites not in self._satisfied:
+                # skipped as a plan candidate while it was satisfied, its predecessors are needed again
+                self._leaves.discard(prerequisites)
+                self._push(prerequisites, self.nodes[prerequisites][1])
+        self.repaired += len(changed)
+        self._best = None
+        open_set = []
+        for _, _, tie, prerequisites, cost in self._open:
+            h = self.heuristic(prerequisites)
+            open_set.append((cost + h, h, tie, prerequisites, cost))
+        heapq.heapify(open_set)
+        self._open = open_set
+
+    @property
+    def best_cost(self) -> float:
+        """ The cost of the plan returned by best_plan, inf if there is none. """
+        return self._best_candidate()[1]
+
+    @property
+    def is_optimal(self) -> bool:
+        """
+        True when no node on the frontier can lead to a plan cheaper than the best-so-far plan returned by best_plan.
+        """
+        self._discard_stale()
+        return not self._open or self._open[0][0] >= self.best_cost
+
+    def _discard_stale(self):
+        while self._open:
+            _, _, _, prerequisites, cost = self._open[0]
+            if prerequisites in self._in_open and cost == self.nodes[prerequisites][1]:
+                return
+            heapq.heappop(self._open)
+
+    def step(self, max_nodes: Optional[int] = None, max_time: Optional[float] = None) -> Optional[Option]:
+        """
+        Expands the search graph until the best plan is proven optimal or the budget runs out.
+
+        :param max_nodes: Maximum number of node expansions in this call, None for no limit.
+        :param max_time: Maximum time in seconds spent in this call, None for no limit.
+        :return: The best-so-far plan, see best_plan.
+        """
+        deadline = time.perf_counter() + max_time if max_time is not None else None
+        action_index = self.goap.action_index
+        expanded = 0
+        while not self.is_optimal:
+            if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.perf_counter() > deadline):
+                break
+            _, _, _, prerequisites, cost = heapq.heappop(self._open)
+            self._in_open.discard(prerequisites)
+            if prerequisites in self._satisfied:
+                # a plan candidate is a leaf while the world validates it
+                self._leaves.add(prerequisites)
+                continue
+            expanded += 1
+            stats = self.goap.stats
+            if stats is not None:
+                stats.expand(prerequisites, cost, len(self._open) + 1)
+            option = self.nodes[prerequisites][0]
+            for action in action_index.producers(prerequisites):
+                if action_index.con_worlds[action].falsifies(prerequisites):
+                    continue
+                new_option = option.prepended(action)
+                if new_option is not None:
+                    if stats is not None:
+                        known = self.nodes.get(new_option.global_prerequisites)
+                        stats.generate(prerequisites, new_option.global_prerequisites, action.name, cost + action.cost, duplicate=known is not None and known[1] <= cost + action.cost)
+                    self._add_node(new_option, cost + action.cost)
+        self.expanded += expanded
+        return self.best_plan()
+
+    def best_plan(self) -> Optional[Option]:
+        """
+        Returns the cheapest plan found so far that is executable from the current world, replayed on an Option starting from it.
+
+        :return: The best-so-far Option, or None if no plan was found yet.
+        """
+        return self._best_candidate()[0]
+
+    def _best_candidate(self) -> Tuple[Optional[Option], float]:
+        """
+        The cheapest plan candidate whose replay from the current world reaches the goal, with its cost, shared by best_plan,
+        best_cost and is_optimal. Candidates whose replay fails are skipped.
+        """
+        if self._best is None:
+            self._best = (None, float('inf'))
+            for prerequisites, cost in sorted(self._satisfied.items(), key=lambda item: item[1]):
+                option = Option(starting_consequences=self.start)
+                if all(option.append(action) for action in self.nodes[prerequisites][0].actions) and option.global_consequences.validates(self.goal):
+                    self._best = (option, cost)
+                    break
+        return self._best
@@ -1,5 +1,9 @@
-from typing import Callable, Tuple, Optional, List, Dict, Set, Union
+from typing import Callable, Tuple, Optional, List, Dict, Set, Union, Sequence
+import heapq
+import weakref
+import numpy as np
 from infinipy.stateblock import StateBlock
+from infinipy.block_columns import BlockColumns
 import itertools
 from dataclasses import dataclass, field, fields
 
@@ -7,24 +11,41 @@ from dataclasses import dataclass, field, fields
 
 class Statement:
     _name_registry = set()  # Class-level registry to track names
+    # Class-level interner mapping dense indices to the live statements. The index of a collected statement is reused by the
+    # next one, smallest first, so that the masks of CompiledCompositeStatement stay as narrow as the live statements allow.
+    _index_registry: 'weakref.WeakValueDictionary[int, Statement]' = weakref.WeakValueDictionary()
+    _free_indices: List[int] = []
+    _next_index = 0
     def __init__(self, 
                  name: str, 
                  description: str, 
                  callable: Callable[[StateBlock, Optional[StateBlock]], bool],
                  usage: str = "both",
-                 required_attributes: Optional[Dict[str, List[str]]] = None):
+                 required_attributes: Optional[Dict[str, List[str]]] = None,
+                 vector_spec: Optional[Tuple] = None):
         """
         Initializes the Statement with a specific condition involving two StateBlocks.
 
         :param name: The name of the statement.
         :param description: A brief description of what the condition checks for.
         :param condition: A callable that takes two StateBlock instances and returns a boolean.
+        :param vector_spec: Optional description of what callable computes, letting evaluate_many use array operations:
+                            ("attribute", attr) for the truth value of block.attr and ("equals", attr, value) for
+                            block.attr == value, block being the source or the target according to usage.
         """
         new_name = name+"_"+usage
         if new_name in Statement._name_registry:
             raise ValueError(f"A Statement with the name '{new_name}' already exists.")
 
         Statement._name_registry.add(new_name)  # Add name to registry
+        # Dense integer index used as bit position by CompiledCompositeStatement
+        if Statement._free_indices:
+            self.index = heapq.heappop(Statement._free_indices)
+        else:
+            self.index = Statement._next_index
+            Statement._next_index += 1
+        Statement._index_registry[self.index] = self
+        weakref.finalize(self, Statement._release, self.index, new_name).atexit = False
         self.base_name = name
         self.name = new_name
         self.description = description
@@ -32,12 +53,33 @@ class Statement:
         self.usage = usage
         self.source_required = required_attributes.get('source') if required_attributes else None
         self.target_required = required_attributes.get('target') if required_attributes else None
+        # (source type, target type) pairs whose required attributes were found, checked once per pair by evaluate
+        self._validated_types: Set[Tuple[type, type]] = set()
+        if vector_spec is not None and vector_spec[0] not in ("attribute", "equals"):
+            raise ValueError(f"Unknown vector spec {vector_spec[0]}, expected 'attribute' or 'equals'")
+        self.vector_spec = vector_spec
 
 
     #class method to retrun the current state ot the name registry
     @classmethod
     def get_name_registry(cls):
         return cls._name_registry
+
+    @classmethod
+    def _release(cls, index: int, name: str):
+        """ Frees the index and the name of a collected statement. """
+        cls._name_registry.discard(name)
+        heapq.heappush(cls._free_indices, index)
+
+    @classmethod
+    def get_statement_by_index(cls, index: int) -> 'Statement':
+        """
+        Returns the Statement interned at the given dense index.
+
+        :param index: The index assigned to the statement at construction.
+        :return: The corresponding Statement.
+        """
+        return cls._index_registry[index]
     
     def check_required_attributes(self, source_block: StateBlock, target_block: Optional[StateBlock]) -> bool:
         """
@@ -141,6 +183,79 @@ class Statement:
             raise ValueError(f"Target block is None but usage is target for statement {self.name}")
         
 
+    def evaluate(self, source_block: StateBlock, target_block: Optional[StateBlock] = None) -> bool:
+        """
+        Fast path of apply returning only the boolean result, without building the explanation dictionary.
+        The required attributes are checked once per pair of source and target types, later calls with the same types skip
+        the check. Use apply when the explanation is needed.
+
+        :param source_block: The StateBlock instance representing the source of the action.
+        :param target_block: The StateBlock instance representing the target of the action.
+        :return: True if the condition is met, False otherwise.
+        """
+        types = (type(source_block), type(target_block))
+        if types not in self._validated_types:
+            if not isinstance(source_block, StateBlock):
+                raise ValueError(f"Source block {source_block} is not a StateBlock.")
+            if not self.check_required_attributes(source_block, target_block)[0]:
+                return False
+            self._validated_types.add(types)
+        if self.usage == "source":
+            return bool(self.callable(source_block))
+        if target_block is None:
+            raise ValueError(f"Target block is None but usage is {self.usage} for statement {self.name}")
+        if self.usage == "target":
+            return bool(self.callable(target_block))
+        return bool(self.callable(source_block, target_block))
+
+    def evaluate_many(self, sources: Union[BlockColumns, Sequence[StateBlock]],
+                      targets: Union[None, StateBlock, BlockColumns, Sequence[StateBlock]] = None) -> np.ndarray:
+        """
+        Evaluates the statement over many blocks at once. Statements with a vector_spec and no required attributes are
+        computed with array operations over a BlockColumns snapshot of the blocks, the others call evaluate in a loop.
+
+        :param sources: The source StateBlocks, or a BlockColumns snapshot of them to share it between statements.
+        :param targets: None, a single target StateBlock used with every source, or one target per source.
+        :return: A boolean array holding the result of evaluate for each source.
+        """
+        sources = BlockColumns.of(sources)
+        if targets is not None and not isinstance(targets, StateBlock):
+            targets = BlockColumns.of(targets)
+            if len(targets) != len(sources):
+                raise ValueError(f"Got {len(targets)} targets for {len(sources)} sources")
+        result = self._evaluate_columns(sources, targets)
+        if result is None:
+            return self._evaluate_rows(sources, targets, range(len(sources)))
+        return result
+
+    def _evaluate_columns(self, sources: BlockColumns, targets: Union[None, StateBlock, BlockColumns]) -> Optional[np.ndarray]:
+        """ The vectorized result, None when the statement cannot be computed from the columns. """
+        if self.vector_spec is None or self.source_required or self.target_required or self.usage not in ("source", "target"):
+            return None
+        if self.usage == "source":
+            columns = sources
+        elif targets is None:
+            raise ValueError(f"Target block is None but usage is target for statement {self.name}")
+        elif isinstance(targets, StateBlock):
+            # one target shared by every source, the result is the same for all of them
+            return np.full(len(sources), bool(len(sources)) and self.evaluate(sources.blocks[0], targets))
+        else:
+            columns = targets
+        if self.vector_spec[0] == "attribute":
+            return columns.truth(self.vector_spec[1])
+        return columns.equals(self.vector_spec[1], self.vector_spec[2])
+
+    def _evaluate_rows(self, sources: BlockColumns, targets: Union[None, StateBlock, BlockColumns], rows) -> np.ndarray:
+        """ Calls evaluate on the given rows, the other rows are False. """
+        result = np.zeros(len(sources), dtype=bool)
+        blocks = sources.blocks
+        for row in rows:
+            if targets is None or isinstance(targets, StateBlock):
+                result[row] = self.evaluate(blocks[row], targets)
+            else:
+                result[row] = self.evaluate(blocks[row], targets.blocks[row])
+        return result
+
     def __call__(self, source_block: StateBlock, target_block: Optional[StateBlock] = None) -> bool:
         """
         Allows the instance to be called as a function, which internally calls the apply method.
@@ -240,6 +355,59 @@ class CompositeStatement:
             "sub_results": [sub["result"] for sub in sub_statements],
         }
 
+    def evaluate(self, source_block: StateBlock, target_block: Optional[StateBlock] = None) -> bool:
+        """
+        Fast path of apply returning only the boolean result, stopping at the first substatement that does not hold.
+        No explanation is built, use apply when it is needed.
+
+        :param source_block: The StateBlock instance representing the source of the action.
+        :param target_block: The StateBlock instance representing the target of the action.
+        :return: True if every substatement has its expected value, False otherwise.
+        """
+        for statement, condition in self._ordered_substatements():
+            if statement.evaluate(source_block, target_block) != condition:
+                return False
+        return True
+
+    def evaluate_many(self, sources: Union[BlockColumns, Sequence[StateBlock]],
+                      targets: Union[None, StateBlock, BlockColumns, Sequence[StateBlock]] = None) -> np.ndarray:
+        """
+        Evaluates the composite over many blocks at once, see Statement.evaluate_many. The substatements computed from the
+        columns are applied first, the others are then only called on the rows still satisfied.
+
+        :param sources: The source StateBlocks, or a BlockColumns snapshot of them.
+        :param targets: None, a single target StateBlock used with every source, or one target per source.
+        :return: A boolean array holding the result of evaluate for each source.
+        """
+        sources = BlockColumns.of(sources)
+        if targets is not None and not isinstance(targets, StateBlock):
+            targets = BlockColumns.of(targets)
+            if len(targets) != len(sources):
+                raise ValueError(f"Got {len(targets)} targets for {len(sources)} sources")
+        result = np.ones(len(sources), dtype=bool)
+        remaining = []
+        for statement, condition in self._ordered_substatements():
+            if not result.any():
+                return result
+            columns = statement._evaluate_columns(sources, targets)
+            if columns is None:
+                remaining.append((statement, condition))
+            else:
+                result &= columns == condition
+        for statement, condition in remaining:
+            rows = np.flatnonzero(result)
+            if not rows.size:
+                break
+            result[rows] = statement._evaluate_rows(sources, targets, rows)[rows] == condition
+        return result
+
+    def _ordered_substatements(self) -> List[Tuple[Statement, bool]]:
+        """ The (statement, condition) pairs in evaluation order, cached since a composite is never modified in place. """
+        order = getattr(self, "_evaluation_order", None)
+        if order is None:
+            order = self._evaluation_order = list(zip(self.statements, self.conditions))
+        return order
+
     
     def merge(self, other: 'CompositeStatement'):
         """Merges with another CompositeStatement, checking for conflicts."""
@@ -346,6 +514,156 @@ class CompositeStatement:
 
     def __call__(self, source_block: StateBlock, target_block: Optional[StateBlock] = None) -> dict:
         return self.apply(source_block, target_block)
+
+    def compile(self) -> 'CompiledCompositeStatement':
+        """
+        Returns the bitset representation of this CompositeStatement.
+        The compiled form has the same semantics but evaluates validates, falsifies and the merge operations with integer bitwise operations.
+        """
+        return CompiledCompositeStatement(list(self.substatements))
+
+
+class CompiledCompositeStatement(CompositeStatement):
+    """
+    Bitset form of a CompositeStatement.
+
+    Every Statement owns a dense index assigned by the Statement interner, the composite is stored as two integers:
+    `mask` has a bit set for every statement mentioned and `values` holds the truth value of those statements.
+    The substatements set is decoded lazily from the masks so that the set-of-tuples API keeps working.
+    The composite keeps a reference to the statements behind its bits, so their indices are not reused while it is alive.
+    """
+    def __init__(self, substatements: List[Tuple[Statement, bool]]):
+        mask = 0
+        values = 0
+        statements = {}
+        for statement, cond in substatements:
+            bit = 1 << statement.index
+            if mask & bit and bool(values & bit) != bool(cond):
+                raise ValueError(f"Conflict detected for '{statement.name}' in CompositeStatement.")
+            mask |= bit
+            if cond:
+                values |= bit
+            statements[statement.index] = statement
+        self._set_masks(mask, values, statements)
+
+    def _set_masks(self, mask: int, values: int, statements: Dict[int, Statement]):
+        self.mask = mask
+        self.values = values & mask
+        # may also hold statements whose bit was removed, it only has to cover the mask
+        self._statements = statements
+        self._substatements = None
+        self._name = None
+
+    @classmethod
+    def from_masks(cls, mask: int, values: int, statements: Optional[Dict[int, Statement]] = None) -> 'CompiledCompositeStatement':
+        """
+        Builds a CompiledCompositeStatement directly from its bitmasks without going through the substatements.
+
+        :param mask: Bitmask of the statements mentioned.
+        :param values: Bitmask of the truth values of the mentioned statements.
+        :param statements: The statements of the bits of mask keyed by index, looked up in the Statement interner if None.
+        :return: A new CompiledCompositeStatement.
+        """
+        if statements is None:
+            statements = {index: Statement.get_statement_by_index(index) for index in cls.iter_bits(mask)}
+        compiled = cls.__new__(cls)
+        compiled._set_masks(mask, values, statements)
+        return compiled
+
+    def _union_statements(self, other: 'CompiledCompositeStatement') -> Dict[int, Statement]:
+        """ The statements covering the bits of both composites, sharing the dictionary of one of them when possible. """
+        if other.mask & ~self.mask == 0:
+            return self._statements
+        if self.mask & ~other.mask == 0:
+            return other._statements
+        return {**self._statements, **other._statements}
+
+    @staticmethod
+    def _as_compiled(other: CompositeStatement) -> 'CompiledCompositeStatement':
+        return other if isinstance(other, CompiledCompositeStatement) else other.compile()
+
+    @staticmethod
+    def iter_bits(mask: int):
+        """Yields the indices of the bits set in mask in increasing order."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    @property
+    def substatements(self) -> Set[Tuple[Statement, bool]]:
+        if self._substatements is None:
+            self._substatements = {(self._statements[index], bool(self.values >> index & 1)) for index in self.iter_bits(self.mask)}
+        return self._substatements
+
+    @property
+    def statements(self) -> List[Statement]:
+        return [self._statements[index] for index in self.iter_bits(self.mask)]
+
+    @property
+    def conditions(self) -> List[bool]:
+        return [bool(self.values >> index & 1) for index in self.iter_bits(self.mask)]
+
+    @property
+    def name(self) -> str:
+        if self._name is None:
+            self._name = self._derive_name()
+        return self._name
+
+    def compile(self) -> 'CompiledCompositeStatement':
+        return self
+
+    def _conflict_mask(self, other: 'CompiledCompositeStatement') -> int:
+        return (self.values ^ other.values) & self.mask & other.mask
+
+    def merge(self, other: CompositeStatement) -> 'CompiledCompositeStatement':
+        """Merges with another CompositeStatement, checking for conflicts."""
+        other = self._as_compiled(other)
+        conflicts = self._conflict_mask(other)
+        if conflicts:
+            conflict_descriptions = ', '.join([f"'{self._statements[index].name}'" for index in self.iter_bits(conflicts)])
+            raise ValueError(f"Cannot merge due to conflicts in {conflict_descriptions}.")
+        return self.from_masks(self.mask | other.mask, self.values | other.values, self._union_statements(other))
+
+    def is_conflict(self, other: CompositeStatement) -> Tuple[bool, List[Tuple[Statement, bool]]]:
+        """Checks if there is a conflict with another CompositeStatement."""
+        other = self._as_compiled(other)
+        conflicts = self._conflict_mask(other)
+        return (conflicts != 0, [(self._statements[index], bool(self.values >> index & 1)) for index in self.iter_bits(conflicts)])
+
+    def force_merge(self, other: CompositeStatement, force_direction: str = "left") -> 'CompiledCompositeStatement':
+        """
+        Merge with resolution of conflicts based on force_direction. Returns a new CompiledCompositeStatement.
+        """
+        other = self._as_compiled(other)
+        if force_direction == "left":
+            values = self.values | (other.values & ~self.mask)
+        else:
+            values = other.values | (self.values & ~other.mask)
+        return self.from_masks(self.mask | other.mask, values, self._union_statements(other))
+
+    def remove_intersection(self, other: CompositeStatement) -> 'CompiledCompositeStatement':
+        """
+        Remove the intersection of two CompositeStatements.
+        """
+        other = self._as_compiled(other)
+        intersection = self.mask & other.mask & ~(self.values ^ other.values)
+        return self.from_masks(self.mask & ~intersection, self.values, self._statements)
+
+    def falsifies(self, other: CompositeStatement) -> bool:
+        return self._conflict_mask(self._as_compiled(other)) != 0
+
+    def validates(self, other: CompositeStatement) -> bool:
+        other = self._as_compiled(other)
+        return other.mask & ~self.mask == 0 and (self.values ^ other.values) & other.mask == 0
+
+    def __eq__(self, other):
+        if not isinstance(other, CompiledCompositeStatement):
+            return NotImplemented
+        return self.mask == other.mask and self.values == other.values
+
+    def __hash__(self):
+        return hash((self.mask, self.values))
     
 
 
@@ -45,7 +45,8 @@ class StatementFactory:
                         name=statement_name,
                         description=f"Checks if {attr} is True.",
                         callable=lambda block, attr=attr: getattr(block, attr),
-                        usage='target'
+                        usage='target',
+                        vector_spec=("attribute", attr)
                     )
                 statements.append((self.statements_target_registry[statement_name], getattr(state_block, attr)))
 
@@ -56,7 +57,8 @@ class StatementFactory:
                         name=statement_name,
                         description=f"Checks if {attr} is True.",
                         callable=lambda block, attr=attr: getattr(block, attr),
-                        usage='source'
+                        usage='source',
+                        vector_spec=("attribute", attr)
                     )
                     statements.append((self.statements_source_registry[statement_name], getattr(state_block, attr)))
         # print("sub_inside",len(statements))
@@ -84,13 +86,15 @@ class StatementFactory:
                     name=statement_name,
                     description=f"Entity is at position {pos}.",
                     callable=lambda block, pos=pos: block.position == pos,
-                    usage='source'
+                    usage='source',
+                    vector_spec=("equals", "position", pos)
                 )
                 target_spatial_statements[pos] = Statement(
                     name=statement_name,
                     description=f"Entity is at position {pos}.",
                     callable=lambda block, pos=pos: block.position == pos,
-                    usage='target'
+                    usage='target',
+                    vector_spec=("equals", "position", pos)
                 )
         return source_spatial_statements, target_spatial_statements
 
@@ -0,0 +1,58 @@
+from typing import Dict, List, Tuple, Optional, Union, Iterator
+from infinipy.stateblock import StateBlock
+from infinipy.statement import Statement, CompositeStatement
+
+
+class StatementView:
+    def __init__(self, statement: Union[Statement, CompositeStatement], target: Optional[StateBlock] = None):
+        """
+        Materialized set of the entities satisfying a Statement or CompositeStatement, applied with the entity as source.
+        A view is filled and kept up to date by the GridMap it is registered on with GridMap.register_view, which only
+        re-evaluates the entities touched by its add, remove, move and affordance operations.
+
+        :param statement: The Statement or CompositeStatement evaluated.
+        :param target: The target StateBlock of the statement, None for statements only using the source.
+        """
+        statements = statement.statements if isinstance(statement, CompositeStatement) else [statement]
+        if target is None and any(sub.usage != "source" for sub in statements):
+            raise ValueError(f"Statement {statement.name} needs a target to be materialized")
+        self.statement = statement
+        self.target = target
+        self.entities: Dict[str, StateBlock] = {}
+        self.evaluations = 0
+
+    @property
+    def key(self) -> Tuple[Union[Statement, CompositeStatement], Optional[str]]:
+        return self.statement, self.target.id if self.target is not None else None
+
+    def satisfied_by(self, entity: StateBlock) -> bool:
+        """ Evaluates the statement on an entity. """
+        self.evaluations += 1
+        return self.statement.evaluate(entity, self.target)
+
+    def update(self, entity: StateBlock):
+        """ Re-evaluates an entity and adds it to or removes it from the view. """
+        if self.satisfied_by(entity):
+            self.entities[entity.id] = entity
+        else:
+            self.entities.pop(entity.id, None)
+
+    def discard(self, entity: StateBlock):
+        """ Removes an entity that left the map. """
+        self.entities.pop(entity.id, None)
+
+    def __contains__(self, entity: StateBlock) -> bool:
+        return entity.id in self.entities
+
+    def __iter__(self) -> Iterator[StateBlock]:
+        return iter(list(self.entities.values()))
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def positions(self) -> List[Tuple[int, int, int]]:
+        """ The distinct positions of the entities of the view. """
+        return list({entity.position for entity in self.entities.values()})
+
+    def __repr__(self):
+        return f"StatementView({self.statement.name}, entities={len(self.entities)})"
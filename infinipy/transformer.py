@@ -37,8 +37,7 @@ class Transformer:
         :param target_block: The StateBlock representing the target of the action.
         """
         if self.consequences:
-            result = self.consequences(source_block, target_block)
-            if not result['result']:
+            if not self.consequences.evaluate(source_block, target_block):
                 raise ValueError(f"Transformation consequences did not meet the expected outcome. for transformer {self.name}")
         else:
             raise NotImplementedError(f"No consequences defined for this transformer. {self.name}")
@@ -102,8 +101,7 @@ class CompositeTransformer:
                 transformer.apply(source_block, target_block, evaluate=local_evaluate)
 
         if global_evaluate:
-            result = self.composite_consequence(source_block, target_block)
-            if not result['result']:
+            if not self.composite_consequence.evaluate(source_block, target_block):
                 raise ValueError(f"Global consequences did not meet the expected outcome for composite {self.name} with source {source_block} and target {target_block}")
             
     def apply_consequences(self, source_block: StateBlock, target_block: StateBlock):
@@ -1,6 +1,8 @@
 from infinipy.statement import CompositeStatement
 from infinipy.stateblock import StateBlock
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Any, Hashable
+from collections import OrderedDict
+import threading
 
 #compares two composite statements, each with a usage, the output is a dictionary with the results for the four tuples:
 # AND, AND
@@ -57,4 +59,54 @@ def compare_composite_statements(statement_1: Tuple[CompositeStatement, str], st
         'AND NOT, AND NOT': categorize_statements(force_results_1_and_not, force_results_2_and_not),
     }
 
-    return results
\ No newline at end of file
+    return results
+
+
+class LRUCache:
+    def __init__(self, maxsize: Optional[int] = 1024):
+        """
+        Thread-safe least recently used cache with a size limit.
+
+        :param maxsize: Maximum number of entries, None for an unbounded cache.
+        """
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Returns the value stored for key and marks it as most recently used, or default if it is missing. """
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """ Stores value for key, evicting the least recently used entries beyond maxsize. """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """ Removes key and returns its value, or default if it is missing. """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """ Returns a snapshot of the entries, from the least to the most recently used, without changing their order. """
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,73 @@
+from typing import Dict, Tuple, Optional, Hashable, FrozenSet, TYPE_CHECKING
+from infinipy.utils import LRUCache
+if TYPE_CHECKING:
+    from infinipy.gridmap import GridMap
+
+Position = Tuple[int, int, int]
+
+
+class Visibility:
+    def __init__(self, grid_map: 'GridMap', maxsize: Optional[int] = 256, light_walls: bool = True):
+        """
+        Visibility service of a GridMap, caching fields of view and reporting how they change for moving viewers.
+
+        Fields of view are cached per (origin, radius, blocks_los_version), so a viewer standing still or coming back to a
+        cell costs a lookup and any change of a line of sight blocker makes the cached fields unreachable. For each viewer
+        the last visible set is kept, so that update returns the cells that entered and exited its view, and consumers such
+        as a fog of war layer only touch those cells.
+
+        :param grid_map: The GridMap whose field_of_view is cached.
+        :param maxsize: Maximum number of cached fields of view, least recently used ones are evicted first.
+        :param light_walls: If True, the visible faces of the cells blocking line of sight are included.
+        """
+        self.grid_map = grid_map
+        self.light_walls = light_walls
+        self.fields = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._viewers: Dict[Hashable, FrozenSet[Position]] = {}
+
+    def visible(self, origin: Position, radius: Optional[int] = None) -> FrozenSet[Position]:
+        """
+        The positions visible from origin, see GridMap.field_of_view.
+
+        :param origin: The position seeing.
+        :param radius: The maximum Euclidean distance of the visible cells, None for the whole map.
+        :return: The frozen set of visible positions, origin included.
+        """
+        key = (origin, radius, self.grid_map.blocks_los_version)
+        field = self.fields.get(key)
+        if field is not None:
+            self.hits += 1
+            return field
+        self.misses += 1
+        field = frozenset(self.grid_map.field_of_view(origin, radius, self.light_walls))
+        self.fields.put(key, field)
+        return field
+
+    def update(self, origin: Position, radius: Optional[int] = None,
+               viewer: Hashable = None) -> Tuple[FrozenSet[Position], FrozenSet[Position], FrozenSet[Position]]:
+        """
+        Moves a viewer to origin and returns how its view changed since its previous update.
+
+        :param origin: The new position of the viewer.
+        :param radius: The maximum Euclidean distance of the visible cells, None for the whole map.
+        :param viewer: Any hashable identifying the viewer, e.g. an entity id.
+        :return: (visible, entered, exited), the positions visible now, the ones that were not visible at the previous update
+                 and the ones that are no longer visible. On the first update of a viewer every visible position has entered.
+        """
+        visible = self.visible(origin, radius)
+        previous = self._viewers.get(viewer, frozenset())
+        self._viewers[viewer] = visible
+        if previous is visible:
+            return visible, frozenset(), frozenset()
+        return visible, visible - previous, previous - visible
+
+    def forget(self, viewer: Hashable = None):
+        """ Drops the last visible set of a viewer, its next update reports every visible position as entered. """
+        self._viewers.pop(viewer, None)
+
+    def clear(self):
+        """ Removes every cached field of view and every viewer. """
+        self.fields.clear()
+        self._viewers.clear()
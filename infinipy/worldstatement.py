@@ -2,10 +2,13 @@ from typing import List, Tuple, Optional, Dict
 from infinipy.stateblock import StateBlock
 from infinipy.statement import CompositeStatement
 
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, FrozenSet, TYPE_CHECKING
+from types import MappingProxyType
+import weakref
 from infinipy.stateblock import StateBlock
-from infinipy.statement import CompositeStatement, Statement
-from infinipy.actions import Action
+from infinipy.statement import CompositeStatement, CompiledCompositeStatement, Statement
+if TYPE_CHECKING:
+    from infinipy.actions import Action
 
 class WorldStatement:
     def __init__(self, statements: List[Tuple[CompositeStatement, Optional[str], Optional[str]]]):
@@ -46,6 +49,21 @@ class WorldStatement:
 
         return conditions_dict
 
+    @property
+    def fingerprint(self) -> FrozenSet:
+        """
+        Order independent and hashable form of the current conditions, equal for two worlds holding the same conditions.
+        WorldStatements are mutable and compare by identity, compare their fingerprints to compare their content.
+        Keys whose CompositeStatement is empty hold no condition and are left out, categorize_statements never creates them
+        and InternedWorldStatement drops them, so a WorldStatement has the fingerprint of its interned version.
+        """
+        fingerprint = []
+        for key, value in self.conditions.items():
+            compiled = value.compile()
+            if compiled.mask:
+                fingerprint.append((key, compiled.mask, compiled.values))
+        return frozenset(fingerprint)
+
     def _derive_key(self, statement:Statement, source_id:str, target_id:str):
         """
         Derives the appropriate key for the conditions dictionary.
@@ -165,7 +183,7 @@ class WorldStatement:
                 not_found += 1
         return conflicts, not_found
     
-    def allows_action(self, action: Action, reverse = False) -> bool:
+    def allows_action(self, action: 'Action', reverse = False) -> bool:
         """
         Checks if the current world state validates the prerequisites of the given action.
 
@@ -174,12 +192,12 @@ class WorldStatement:
         """
         if reverse:
             # print("reverse",action.name)
-            post_action_world_statement = WorldStatement.from_dict(action.con_dict)
+            post_action_world_statement = action.con_world
             return not self.is_falsified_by(post_action_world_statement)
-        action_pre_world_statement = WorldStatement.from_dict(action.pre_dict)
+        action_pre_world_statement = action.pre_world
         return self.validates(action_pre_world_statement)
 
-    def available_actions(self, actions: List[Action],reverse=False) -> List[Action]:
+    def available_actions(self, actions: List['Action'],reverse=False) -> List['Action']:
         """
         Determines which actions from a given list are available based on the current world state.
 
@@ -206,4 +224,122 @@ class WorldStatement:
             statements.append((composite_statement, source_id, target_id))
 
         return cls(statements)
-    
\ No newline at end of file
+
+
+class InternedWorldStatement(WorldStatement):
+    """
+    Immutable, hash-consed WorldStatement.
+
+    Conditions are stored as CompiledCompositeStatements in a read-only mapping and equal worlds are interned to a single object,
+    so identity comparison and hashing are structural. Merge operations only rebuild the (source_id, target_id) entries they change,
+    unchanged entries are shared by reference between the parent and the resulting world.
+    """
+    _intern_table = weakref.WeakValueDictionary()
+    fingerprint = None  # set by _from_conditions, computed once per interned world
+
+    def __new__(cls, statements: Optional[List[Tuple[CompositeStatement, Optional[str], Optional[str]]]] = None):
+        conditions = WorldStatement(statements or []).conditions
+        return cls._from_conditions({key: value.compile() for key, value in conditions.items()})
+
+    def __init__(self, statements: Optional[List[Tuple[CompositeStatement, Optional[str], Optional[str]]]] = None):
+        """
+        Initializes an InternedWorldStatement with a list of CompositeStatements and their source and target StateBlocks.
+        The actual construction happens in __new__, which may return an already interned world.
+
+        :param statements: A list of tuples, each containing a CompositeStatement, a source StateBlock id, and an optional target StateBlock id.
+        """
+
+    @classmethod
+    def _from_conditions(cls, conditions: Dict[Tuple[Optional[str], Optional[str]], CompiledCompositeStatement]) -> 'InternedWorldStatement':
+        """
+        Returns the interned world for a dictionary of compiled conditions, creating it if it does not exist yet.
+        Keys with empty CompositeStatements are dropped, matching the behaviour of categorize_statements, so the keys of
+        conditions are the same as the ones of the equivalent WorldStatement.
+        """
+        conditions = {key: value for key, value in conditions.items() if value.mask}
+        fingerprint = frozenset((key, value.mask, value.values) for key, value in conditions.items())
+        world = cls._intern_table.get(fingerprint)
+        if world is None:
+            world = object.__new__(cls)
+            world.conditions = MappingProxyType(conditions)
+            world.fingerprint = fingerprint
+            cls._intern_table[fingerprint] = world
+        return world
+
+    @classmethod
+    def intern(cls, world: WorldStatement) -> 'InternedWorldStatement':
+        """
+        Returns the interned version of any WorldStatement.
+
+        :param world: The WorldStatement to intern.
+        :return: The equivalent InternedWorldStatement.
+        """
+        if isinstance(world, cls):
+            return world
+        return cls._from_conditions({key: value.compile() for key, value in world.conditions.items()})
+
+    @property
+    def statements(self) -> List[Tuple[CompositeStatement, Optional[str], Optional[str]]]:
+        return [(value, key[0], key[1]) for key, value in self.conditions.items()]
+
+    def __eq__(self, other):
+        # interned worlds are immutable and equal interned worlds are the same object, so identity is content equality
+        if isinstance(other, InternedWorldStatement):
+            return self is other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    @staticmethod
+    def _shared(old: CompiledCompositeStatement, new: CompiledCompositeStatement) -> CompiledCompositeStatement:
+        """Keeps the existing CompositeStatement when an operation leaves it unchanged."""
+        return old if old == new else new
+
+    def remove_intersection(self, other: WorldStatement) -> 'InternedWorldStatement':
+        other = self.intern(other)
+        conditions = dict(self.conditions)
+        for key, value in self.conditions.items():
+            if key in other.conditions:
+                conditions[key] = self._shared(value, value.remove_intersection(other.conditions[key]))
+        return self._from_conditions(conditions)
+
+    def merge(self, other: WorldStatement) -> 'InternedWorldStatement':
+        other = self.intern(other)
+        conditions = dict(self.conditions)
+        for key, value in other.conditions.items():
+            if key in conditions:
+                conditions[key] = self._shared(conditions[key], conditions[key].merge(value))
+            else:
+                conditions[key] = value
+        return self._from_conditions(conditions)
+
+    def force_merge(self, other: WorldStatement, force_direction: str = "left") -> 'InternedWorldStatement':
+        other = self.intern(other)
+        conditions = dict(self.conditions)
+        for key, value in other.conditions.items():
+            if key in conditions:
+                conditions[key] = self._shared(conditions[key], conditions[key].force_merge(value, force_direction))
+            else:
+                conditions[key] = value
+        return self._from_conditions(conditions)
+
+    def falsifies(self, other: WorldStatement) -> bool:
+        return super().falsifies(self.intern(other))
+
+    def is_falsified_by(self, other: WorldStatement) -> bool:
+        return self.intern(other).falsifies(self)
+
+    def validates(self, other: WorldStatement) -> bool:
+        other = self.intern(other)
+        for key, value in other.conditions.items():
+            own = self.conditions.get(key)
+            if own is None or not own.validates(value):
+                return False
+        return True
+
+    def is_validated_by(self, other: WorldStatement) -> bool:
+        return self.intern(other).validates(self)
+
+    def __repr__(self):
+        return f"InternedWorldStatement({', '.join(f'{key}: {value.name}' for key, value in self.conditions.items())})"